@@ -1,17 +1,24 @@
 # app.py
-import base64
+import tempfile
 from io import StringIO
 import streamlit as st
 import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import os
 
 # Importa módulos personalizados
-from src.data_manager import initialize_data, add_transaction, get_transactions
-from src.dre_calculator import calcular_dre
-from src.visualizations import criar_grafico_evolucao, criar_grafico_distribuicao_despesas
+from src.data_manager import (
+    initialize_data, add_transaction, add_transactions, get_transactions, get_cubo, possui_transacoes, import_csv,
+    consultar_transacoes,
+    exportar_transacoes, ler_marcador_exportacao, salvar_marcador_exportacao
+)
+from src.dre_calculator import calcular_dre, calcular_dre_multi, periodo_da_janela
+from src.plano_contas import carregar_plano_contas
+from src.projecao import SEMENTE_PADRAO, projetar_dre
+from src.visualizations import criar_grafico_evolucao, criar_grafico_distribuicao_despesas, criar_grafico_comparacao
 from utils.validators import validar_formulario
-from utils.formatters import formatar_moeda, formatar_data
+from utils.formatters import formatar_moeda, formatar_moeda_serie, formatar_data_serie
 
 # Configuração da página
 st.set_page_config(
@@ -34,6 +41,28 @@ if 'data_initialized' not in st.session_state:
 # Lista de empresas (poderia vir de um banco de dados)
 empresas = ["🚗 Transmaster", "💵 JM"]
 
+# Opções de agrupamento e de janela do DRE (valor -> rótulo exibido)
+GRANULARIDADES_DRE = {
+    'diaria': "Diário",
+    'semanal': "Semanal",
+    'mensal': "Mensal",
+    'trimestral': "Trimestral",
+    'anual': "Anual"
+}
+JANELAS_DRE = {
+    None: "Do período",
+    'ytd': "Acumulado no ano",
+    'ttm': "Últimos 12 meses"
+}
+
+# Ordenações do navegador de lançamentos: opção -> (rótulo, coluna, decrescente)
+ORDENACOES_LANCAMENTOS = {
+    'recentes': ("Mais recentes", 'data', True),
+    'antigos': ("Mais antigos", 'data', False),
+    'maior_valor': ("Maior valor", 'valor', True),
+    'menor_valor': ("Menor valor", 'valor', False)
+}
+
 # Sidebar para navegação
 st.sidebar.title("DRE App")
 pagina = st.sidebar.radio(
@@ -42,77 +71,59 @@ pagina = st.sidebar.radio(
 )
 
 # Função para gerar dados de exemplo
-def gerar_dados_exemplo():
-    """Gera dados de exemplo para 6 meses e 2 empresas"""
-    import random
+def gerar_dados_exemplo(empresas_exemplo=None, linhas_por_empresa=70, dias=180, seed=None):
+    """
+    Gera dados de exemplo para os últimos meses e grava tudo em uma única escrita.
+    
+    Args:
+        empresas_exemplo: Lista de empresas (padrão: empresas do app)
+        linhas_por_empresa: Número de lançamentos gerados por empresa
+        dias: Janela, em dias até hoje, em que as datas são sorteadas
+        seed: Semente do gerador aleatório (opcional)
+        
+    Returns:
+        int: Número de registros gerados
+    """
+    if empresas_exemplo is None:
+        empresas_exemplo = empresas
     
-    # Empresas e tipos
-    empresas_exemplo = ["🚗 Transmaster", "💵 JM"]
+    rng = np.random.default_rng(seed)
     
-    # Categorias por tipo
+    # Tipos, proporção de lançamentos e faixa de valores de cada um
+    tipos = np.array(["Receita", "Custo", "Despesa"])
+    proporcoes = np.array([4, 3, 4.5]) / 11.5
+    valor_minimo = np.array([3000, 1000, 500])
+    valor_maximo = np.array([8000, 4000, 3000])
+    
+    # Categorias por tipo, concatenadas com o deslocamento de cada tipo
     categorias = {
         "Receita": ["Vendas", "Serviços", "Assinaturas", "Outros"],
         "Custo": ["Matéria-prima", "Produção", "Logística", "Outros"],
         "Despesa": ["Aluguel", "Salários", "Marketing", "Utilities", "Outros"]
     }
+    todas_categorias = np.array([c for tipo in tipos for c in categorias[tipo]])
+    qtd_categorias = np.array([len(categorias[tipo]) for tipo in tipos])
+    deslocamento = np.concatenate([[0], np.cumsum(qtd_categorias)[:-1]])
     
-    # Data inicial (6 meses atrás)
-    data_inicial = datetime.now() - timedelta(days=180)
+    # Sorteia todas as colunas de uma vez
+    total = linhas_por_empresa * len(empresas_exemplo)
+    idx_empresa = np.repeat(np.arange(len(empresas_exemplo)), linhas_por_empresa)
+    idx_tipo = rng.choice(len(tipos), size=total, p=proporcoes)
+    idx_categoria = deslocamento[idx_tipo] + (rng.random(total) * qtd_categorias[idx_tipo]).astype(int)
+    valores = rng.integers(valor_minimo[idx_tipo], valor_maximo[idx_tipo], endpoint=True)
+    hoje = np.datetime64(datetime.now().date(), 'D')
+    datas = hoje - rng.integers(0, dias, size=total)
     
-    # Contador de transações
-    contador = 0
+    df_exemplo = pd.DataFrame({
+        'empresa': np.asarray(empresas_exemplo, dtype=object)[idx_empresa],
+        'data': np.datetime_as_string(datas, unit='D'),
+        'tipo': tipos[idx_tipo],
+        'descricao': todas_categorias[idx_categoria],
+        'valor': valores
+    })
     
-    # Gera transações para cada mês
-    for mes in range(6):
-        data_mes = data_inicial + timedelta(days=30 * mes)
-        
-        for empresa in empresas_exemplo:
-            # Gera receitas (3-5 por mês)
-            for _ in range(random.randint(3, 5)):
-                categoria = random.choice(categorias["Receita"])
-                valor = random.randint(3000, 8000)
-                
-                # Adiciona transação
-                add_transaction(
-                    empresa=empresa,
-                    data=(data_mes + timedelta(days=random.randint(1, 28))).strftime('%Y-%m-%d'),
-                    tipo="Receita",
-                    descricao=categoria,
-                    valor=valor
-                )
-                contador += 1
-            
-            # Gera custos (2-4 por mês)
-            for _ in range(random.randint(2, 4)):
-                categoria = random.choice(categorias["Custo"])
-                valor = random.randint(1000, 4000)
-                
-                # Adiciona transação
-                add_transaction(
-                    empresa=empresa,
-                    data=(data_mes + timedelta(days=random.randint(1, 28))).strftime('%Y-%m-%d'),
-                    tipo="Custo",
-                    descricao=categoria,
-                    valor=valor
-                )
-                contador += 1
-            
-            # Gera despesas (3-6 por mês)
-            for _ in range(random.randint(3, 6)):
-                categoria = random.choice(categorias["Despesa"])
-                valor = random.randint(500, 3000)
-                
-                # Adiciona transação
-                add_transaction(
-                    empresa=empresa,
-                    data=(data_mes + timedelta(days=random.randint(1, 28))).strftime('%Y-%m-%d'),
-                    tipo="Despesa",
-                    descricao=categoria,
-                    valor=valor
-                )
-                contador += 1
-    
-    return contador
+    # Grava todas as linhas com uma única escrita
+    return len(add_transactions(df_exemplo))
 
 # Função para a página de Dashboard
 def pagina_dashboard():
@@ -130,11 +141,8 @@ def pagina_dashboard():
             key="dash_periodo"
         )
     
-    # Carrega os dados
-    df = get_transactions()
-    
     # Verifica se há dados
-    if df.empty:
+    if not possui_transacoes():
         st.info("Não há dados disponíveis. Adicione lançamentos na página 'Lançamentos' ou use o botão abaixo para gerar dados de exemplo.")
         
         if st.button("Gerar Dados de Exemplo"):
@@ -142,6 +150,9 @@ def pagina_dashboard():
             st.success(f"{contador} registros de exemplo foram gerados com sucesso!")
             st.experimental_rerun()
     else:
+        # Somas mensais da empresa e do período, a partir do cubo pré-agregado
+        df = get_cubo(empresa, periodo)
+        
         # Calcula o DRE para a empresa e período selecionados
         resultado_dre = calcular_dre(df, empresa, periodo)
         
@@ -173,6 +184,40 @@ def pagina_dashboard():
             st.subheader("Distribuição de Despesas")
             st.plotly_chart(criar_grafico_distribuicao_despesas(df, empresa, periodo), use_container_width=True)
 
+# Prefixo dos arquivos temporários de exportação e tempo (segundos) após o
+# qual os de sessões abandonadas (nunca baixados) são removidos
+PREFIXO_EXPORTACAO = "dre_exportacao_"
+VALIDADE_EXPORTACAO = 24 * 60 * 60
+
+# Remove os arquivos da exportação atual da sessão, se houver
+def descartar_exportacao():
+    exportacao = st.session_state.pop('exportacao', None)
+    if exportacao:
+        for caminho in (exportacao['caminho'], exportacao['ids']):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+
+# Remove exportações de sessões encerradas sem download (as sessões ativas
+# não guardam arquivos mais antigos que a validade)
+def limpar_exportacoes_abandonadas():
+    limite = datetime.now().timestamp() - VALIDADE_EXPORTACAO
+    diretorio = tempfile.gettempdir()
+    
+    for nome in os.listdir(diretorio):
+        caminho = os.path.join(diretorio, nome)
+        try:
+            if nome.startswith(PREFIXO_EXPORTACAO) and os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            # Arquivo removido ao mesmo tempo por outra sessão
+            pass
+
+# Chamada ao clicar em "Baixar Exportação": o conteúdo já foi entregue ao
+# download_button, então os arquivos temporários podem ser removidos
+def concluir_exportacao(caminho_ids):
+    salvar_marcador_exportacao(caminho_ids)
+    descartar_exportacao()
+
 # Função para a página de Lançamentos
 def pagina_lancamentos():
     st.title("Lançamento de Movimentações")
@@ -211,20 +256,59 @@ def pagina_lancamentos():
             else:
                 st.error("Por favor, preencha todos os campos corretamente.")
     
-    # Exibe os últimos lançamentos
-    st.subheader("Últimos Lançamentos")
+    # Exibe os lançamentos, uma página por vez
+    st.subheader("Lançamentos Registrados")
     
-    df = get_transactions()
-    if not df.empty:
-        # Ordena por data decrescente e exibe os últimos 10
-        df_sorted = df.sort_values(by='data', ascending=False).head(10)
+    if possui_transacoes():
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            filtro_empresa = st.selectbox("Empresa", ["Todas"] + empresas, key="lanc_empresa")
+        
+        with col2:
+            filtro_tipo = st.selectbox("Tipo", ["Todos", "Receita", "Custo", "Despesa"], key="lanc_tipo")
+        
+        with col3:
+            ordenacao = st.selectbox(
+                "Ordenar por",
+                list(ORDENACOES_LANCAMENTOS),
+                format_func=lambda opcao: ORDENACOES_LANCAMENTOS[opcao][0],
+                key="lanc_ordem"
+            )
+            _, ordenar_por, decrescente = ORDENACOES_LANCAMENTOS[ordenacao]
+        
+        with col4:
+            por_pagina = st.selectbox("Por página", [10, 25, 50, 100], key="lanc_por_pagina")
+        
+        empresa_filtro = None if filtro_empresa == "Todas" else filtro_empresa
+        tipo_filtro = None if filtro_tipo == "Todos" else filtro_tipo
+        
+        # Número de páginas (a consulta sem linhas só conta os lançamentos)
+        _, total = consultar_transacoes(empresa_filtro, tipo_filtro, limit=0)
+        paginas = max(1, -(-total // por_pagina))
+        
+        # Volta para a última página se os filtros reduziram o total
+        if st.session_state.get("lanc_pagina", 1) > paginas:
+            st.session_state["lanc_pagina"] = paginas
+        
+        pagina_atual = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key="lanc_pagina")
+        
+        # Seleciona apenas as linhas da página, sem ordenar todo o histórico
+        df_pagina, total = consultar_transacoes(
+            empresa_filtro, tipo_filtro,
+            ordenar_por=ordenar_por,
+            decrescente=decrescente,
+            offset=(pagina_atual - 1) * por_pagina,
+            limit=por_pagina
+        )
         
-        # Formata para exibição
-        df_display = df_sorted.copy()
-        df_display['data'] = df_display['data'].apply(lambda x: formatar_data(x))
-        df_display['valor'] = df_display['valor'].apply(lambda x: formatar_moeda(x))
+        # Formata para exibição apenas a página
+        df_display = df_pagina.copy()
+        df_display['data'] = formatar_data_serie(df_display['data'])
+        df_display['valor'] = formatar_moeda_serie(df_display['valor'])
         
-        st.dataframe(df_display[['empresa', 'data', 'tipo', 'descricao', 'valor']])
+        st.dataframe(df_display[['empresa', 'data', 'tipo', 'descricao', 'valor']], hide_index=True)
+        st.caption(f"{total} lançamentos · página {pagina_atual} de {paginas}")
     else:
         st.info("Não há lançamentos registrados.")
         
@@ -241,13 +325,51 @@ def pagina_lancamentos():
     
     with col1:
         st.markdown("### Exportar Dados")
-        df_export = get_transactions()  # Obtém todos os dados atuais
-        if not df_export.empty:
-            # Função para gerar link de download
-            csv = df_export.to_csv(index=False)
-            b64 = base64.b64encode(csv.encode()).decode()
-            href = f'<a href="data:file/csv;base64,{b64}" download="dados_financeiros.csv">Baixar CSV</a>'
-            st.markdown(href, unsafe_allow_html=True)
+        if possui_transacoes():
+            compactar = st.checkbox("Compactar (gzip)", key="export_gzip")
+            marcador = ler_marcador_exportacao()
+            incremental = st.checkbox(
+                "Somente lançamentos novos desde a última exportação",
+                key="export_incremental",
+                disabled=marcador is None,
+                help=(
+                    f"Omite os {marcador['exportados']} lançamentos já exportados (última exportação: {marcador['data']})."
+                    if marcador else "Nenhuma exportação registrada."
+                )
+            )
+            
+            # O arquivo só é gerado quando solicitado, e em blocos, fora da página
+            if st.button("Gerar Exportação"):
+                # Um arquivo por sessão: o da exportação anterior é removido
+                descartar_exportacao()
+                limpar_exportacoes_abandonadas()
+                
+                extensao = "csv.gz" if compactar else "csv"
+                with tempfile.NamedTemporaryFile(prefix=PREFIXO_EXPORTACAO, suffix=f".{extensao}", delete=False) as arquivo:
+                    # Os IDs exportados vão para o marcador só quando o arquivo for baixado
+                    caminho_ids = arquivo.name + ".ids"
+                    resumo = exportar_transacoes(
+                        arquivo,
+                        compactar=compactar,
+                        incremental=incremental,
+                        arquivo_ids=caminho_ids
+                    )
+                st.session_state.exportacao = {'caminho': arquivo.name, 'ids': caminho_ids, 'extensao': extensao, **resumo}
+            
+            exportacao = st.session_state.get('exportacao')
+            if exportacao and os.path.exists(exportacao['caminho']):
+                st.caption(f"{exportacao['linhas']} lançamentos exportados.")
+                with open(exportacao['caminho'], 'rb') as arquivo:
+                    st.download_button(
+                        label="Baixar Exportação",
+                        data=arquivo,
+                        file_name=f"dados_financeiros.{exportacao['extensao']}",
+                        mime="application/gzip" if exportacao['extensao'].endswith("gz") else "text/csv",
+                        # Registra o marcador quando o arquivo é de fato baixado
+                        # e remove o arquivo temporário
+                        on_click=concluir_exportacao,
+                        args=(exportacao['ids'],)
+                    )
         else:
             st.info("Não há dados para exportar.")
     
@@ -257,44 +379,21 @@ def pagina_lancamentos():
         
         if uploaded_file is not None:
             if st.button("Processar Importação"):
-                try:
-                    # Lê o arquivo enviado
-                    df_imported = pd.read_csv(uploaded_file)
-                    
-                    # Verifica se o arquivo tem as colunas necessárias
-                    required_columns = ['empresa', 'data', 'tipo', 'descricao', 'valor']
-                    missing_columns = [col for col in required_columns if col not in df_imported.columns]
-                    
-                    if missing_columns:
-                        st.error(f"Arquivo inválido. Colunas ausentes: {', '.join(missing_columns)}")
-                    else:
-                        # Se não tiver coluna 'id', adiciona IDs baseados no timestamp
-                        if 'id' not in df_imported.columns:
-                            base_timestamp = int(datetime.now().timestamp())
-                            df_imported['id'] = [base_timestamp + i for i in range(len(df_imported))]
-                        
-                        # Carrega os dados existentes
-                        DATA_PATH = "data/user_data.csv"  # Use o mesmo caminho definido no seu código
-                        if os.path.exists(DATA_PATH):
-                            df_existing = pd.read_csv(DATA_PATH)
-                            
-                            # Adicionar apenas os novos (evitando duplicatas de ID)
-                            existing_ids = set(df_existing['id'].values)
-                            new_records = df_imported[~df_imported['id'].isin(existing_ids)]
-                            df_combined = pd.concat([df_existing, new_records], ignore_index=True)
-                            
-                            # Salva o DataFrame combinado
-                            df_combined.to_csv(DATA_PATH, index=False)
-                        else:
-                            # Se não existir arquivo, salva o importado diretamente
-                            os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-                            df_imported.to_csv(DATA_PATH, index=False)
-                        
-                        st.success(f"Importação concluída com sucesso! {len(df_imported)} registros processados.")
-                        st.experimental_rerun()
+                barra = st.progress(0.0, text="Importando...")
                 
-                except Exception as e:
-                    st.error(f"Erro ao importar dados: {str(e)}")
+                def atualizar_progresso(processados, fracao):
+                    barra.progress(fracao if fracao is not None else 0.0,
+                                   text=f"{processados} registros processados")
+                
+                # Lê o arquivo em lotes, sem carregá-lo inteiro na memória
+                success, message = import_csv(uploaded_file, progresso=atualizar_progresso)
+                barra.empty()
+                
+                if success:
+                    st.success(message)
+                    st.experimental_rerun()
+                else:
+                    st.error(message)
 
 # Função para a página de DRE
 def pagina_dre():
@@ -312,11 +411,27 @@ def pagina_dre():
             key="dre_periodo"
         )
     
-    # Carrega os dados
-    df = get_transactions()
+    col3, col4 = st.columns(2)
+    
+    with col3:
+        granularidade = st.selectbox(
+            "Agrupamento",
+            list(GRANULARIDADES_DRE),
+            index=2,
+            format_func=lambda g: GRANULARIDADES_DRE[g],
+            key="dre_granularidade"
+        )
+    
+    with col4:
+        janela = st.selectbox(
+            "Valores",
+            list(JANELAS_DRE),
+            format_func=lambda j: JANELAS_DRE[j],
+            key="dre_janela"
+        )
     
     # Verifica se há dados
-    if df.empty:
+    if not possui_transacoes():
         st.info("Não há dados disponíveis. Adicione lançamentos na página 'Lançamentos' ou use o botão abaixo para gerar dados de exemplo.")
         
         if st.button("Gerar Dados de Exemplo"):
@@ -324,18 +439,28 @@ def pagina_dre():
             st.success(f"{contador} registros de exemplo foram gerados com sucesso!")
             st.experimental_rerun()
     else:
+        # As janelas acumuladas precisam do histórico anterior ao período
+        periodo_carga = periodo_da_janela(periodo, janela)
+        
+        # Somas mensais a partir do cubo pré-agregado; dias e semanas exigem
+        # as transações
+        if granularidade in ('diaria', 'semanal'):
+            df = get_transactions(empresa, periodo_carga)
+        else:
+            df = get_cubo(empresa, periodo_carga)
+        
         # Calcula o DRE
-        resultado_dre = calcular_dre(df, empresa, periodo)
+        resultado_dre = calcular_dre(df, empresa, periodo, granularidade, janela, carregar_plano_contas())
         
-        # Exibe o DRE mensal
-        st.subheader("DRE Mensal")
+        # Exibe o DRE por período
+        st.subheader(f"DRE {GRANULARIDADES_DRE[granularidade]}" + (f" ({JANELAS_DRE[janela]})" if janela else ""))
         
         # Formata o DRE para exibição
         dre_display = resultado_dre['mensal'].copy()
         
-        # Aplica formatação de moeda a todas as colunas
+        # Aplica formatação de moeda a todas as colunas (uma passada por coluna)
         for coluna in dre_display.columns:
-            dre_display[coluna] = dre_display[coluna].apply(lambda x: formatar_moeda(x))
+            dre_display[coluna] = formatar_moeda_serie(dre_display[coluna])
         
         st.dataframe(dre_display)
         
@@ -355,10 +480,26 @@ def pagina_dre():
         })
         
         # Formata os valores
-        dre_consolidado['Valor'] = dre_consolidado['Valor'].apply(lambda x: formatar_moeda(x))
+        dre_consolidado['Valor'] = formatar_moeda_serie(dre_consolidado['Valor'])
         
         st.dataframe(dre_consolidado)
         
+        # Exibe a árvore do plano de contas, com os subtotais de cada nível
+        if 'contas' in resultado_dre:
+            st.subheader("Plano de Contas")
+            
+            contas = resultado_dre['contas']
+            colunas_valores = [coluna for coluna in contas.columns if coluna not in ('conta', 'nivel')]
+            
+            # Recuo proporcional ao nível da conta
+            contas_display = pd.DataFrame({
+                'Conta': ["\u2003" * nivel + nome for nome, nivel in zip(contas['conta'], contas['nivel'])]
+            })
+            for coluna in colunas_valores:
+                contas_display[coluna] = formatar_moeda_serie(contas[coluna]).to_numpy()
+            
+            st.dataframe(contas_display, hide_index=True)
+        
         # Botão para exportar
         if st.button("Exportar DRE (CSV)"):
             # Cria CSV
@@ -394,11 +535,8 @@ def pagina_graficos():
         ["Evolução Mensal", "Distribuição de Despesas", "Comparação de Empresas"]
     )
     
-    # Carrega os dados
-    df = get_transactions()
-    
     # Verifica se há dados
-    if df.empty:
+    if not possui_transacoes():
         st.info("Não há dados disponíveis. Adicione lançamentos na página 'Lançamentos' ou use o botão abaixo para gerar dados de exemplo.")
         
         if st.button("Gerar Dados de Exemplo"):
@@ -406,9 +544,19 @@ def pagina_graficos():
             st.success(f"{contador} registros de exemplo foram gerados com sucesso!")
             st.experimental_rerun()
     else:
+        # Somas mensais do período (todas as empresas, para a comparação)
+        df = get_cubo(periodo=periodo)
+        
         if tipo_grafico == "Evolução Mensal":
             resultado_dre = calcular_dre(df, empresa, periodo)
-            st.plotly_chart(criar_grafico_evolucao(resultado_dre['mensal']), use_container_width=True)
+            
+            # Projeção dos próximos 12 meses com faixas de percentis
+            projecao = None
+            if st.checkbox("Mostrar projeção (12 meses)", key="graf_projecao"):
+                # Semente fixa: a projeção não muda a cada interação com a página
+                projecao = projetar_dre(resultado_dre['mensal'], seed=SEMENTE_PADRAO)
+            
+            st.plotly_chart(criar_grafico_evolucao(resultado_dre['mensal'], projecao), use_container_width=True)
             
         elif tipo_grafico == "Distribuição de Despesas":
             st.plotly_chart(criar_grafico_distribuicao_despesas(df, empresa, periodo), use_container_width=True)
@@ -417,44 +565,11 @@ def pagina_graficos():
             # Cria um gráfico comparativo entre empresas
             st.subheader("Comparação entre Empresas")
             
-            # Calcula DRE para cada empresa
-            resultados = {}
-            for emp in empresas:
-                resultado_dre = calcular_dre(df, emp, periodo)
-                resultados[emp] = resultado_dre['totais']
-            
-            # Cria DataFrame para comparação
-            df_comparacao = pd.DataFrame({
-                'Empresa': [],
-                'Métrica': [],
-                'Valor': []
-            })
-            
-            for empresa_nome, valores in resultados.items():
-                for metrica, valor in valores.items():
-                    df_comparacao = pd.concat([
-                        df_comparacao, 
-                        pd.DataFrame({
-                            'Empresa': [empresa_nome],
-                            'Métrica': [metrica],
-                            'Valor': [valor]
-                        })
-                    ], ignore_index=True)
-            
-            # Cria gráfico de barras
-            import plotly.express as px
-            
-            fig = px.bar(
-                df_comparacao, 
-                x='Empresa', 
-                y='Valor', 
-                color='Métrica',
-                barmode='group',
-                title='Comparação entre Empresas',
-                labels={'Valor': 'Valor (R$)'}
-            )
+            # Calcula o DRE de todas as empresas com uma única agregação
+            resultados = calcular_dre_multi(df, empresas, periodo)
             
-            st.plotly_chart(fig, use_container_width=True)
+            # Cria gráfico de barras (reaproveitado do cache se os totais não mudaram)
+            st.plotly_chart(criar_grafico_comparacao(resultados), use_container_width=True)
 
 # Renderiza a página selecionada
 if pagina == "Dashboard":
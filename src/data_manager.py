@@ -1,30 +1,1162 @@
 import pandas as pd
+import numpy as np
 import os
+import itertools
+import shutil
+import json
+import sqlite3
+import threading
+import time
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import closing, contextmanager, nullcontext
 from datetime import datetime
+from urllib.parse import quote
+
+from src.filtros import filtrar, indexar, normalizar_periodo
+from utils.formatters import interpretar_datas
+from utils.validators import ERRO_DATA_INVALIDA, ERRO_EMPRESA_VAZIA, descrever_erros, validar_lancamentos
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+    fcntl = None
 
 # Caminho para o arquivo de dados
 DATA_PATH = "data/user_data.csv"
 
-def initialize_data():
+# Banco SQLite usado pelo backend "sqlite"
+SQLITE_PATH = "data/user_data.db"
+
+# Diretório do backend "particionado" (data/particoes/<empresa>/<YYYY-MM>.csv)
+PARTITIONS_PATH = "data/particoes"
+
+# Marcador da última exportação incremental
+EXPORT_MARKER_PATH = "data/ultima_exportacao.json"
+
+# IDs já exportados (int64 ordenados), usados pela exportação incremental
+EXPORT_IDS_PATH = "data/ultima_exportacao.ids"
+
+# Linhas rejeitadas na última importação, com a descrição dos erros
+QUARENTENA_PATH = "data/importacao_rejeitados.csv"
+
+# Segmento append-only onde os novos lançamentos são gravados antes da compactação
+SEGMENT_PATH = "data/user_data.segment.csv"
+
+# Tamanho (em bytes) a partir do qual o segmento é incorporado ao arquivo principal
+COMPACTION_THRESHOLD = 1024 * 1024
+
+# Colunas do arquivo de dados
+COLUNAS = ['id', 'empresa', 'data', 'tipo', 'descricao', 'valor']
+
+# Linhas por lote nas leituras em lotes (iterar_transacoes)
+TAMANHO_LOTE_LEITURA = 100_000
+
+# Colunas aceitas como ordenação em consultar_transacoes
+ORDENACOES = ['data', 'valor', 'id']
+
+# Dimensões e colunas do cubo mensal pré-agregado
+DIMENSOES_CUBO = ['empresa', 'yyyymm', 'tipo', 'descricao']
+COLUNAS_CUBO = DIMENSOES_CUBO + ['valor_centavos']
+
+# Cubo em cache: (assinatura do arquivo, DataFrame consolidado)
+_cache_cubo = {}
+
+# Último ID gerado neste processo; o último gerado por qualquer processo fica
+# no arquivo de IDs do backend (veja _gerar_ids)
+_ultimo_id = 0
+_ids_lock = threading.Lock()
+
+# Sequência usada nos nomes dos lotes aguardando o group commit
+_sequencia_lotes = itertools.count()
+
+# Número máximo de consultas mantidas no cache de leitura
+CACHE_MAX_ENTRADAS = 32
+
+# Cache de leituras: chave da consulta -> (versão, assinatura dos arquivos, DataFrame)
+_cache_leituras = OrderedDict()
+_cache_lock = threading.Lock()
+
+# Contador de escritas feitas por este processo
+_versao_escrita = 0
+
+# Funções chamadas a cada escrita (caches derivados dos dados, como o do DRE)
+_ouvintes_escrita = []
+
+# Origem dos DataFrames entregues por get_transactions e get_cubo:
+# id do DataFrame -> (referência fraca ao DataFrame, origem)
+_origens = {}
+
+def tipar_transacoes(df):
+    """
+    Converte as transações lidas do armazenamento para a representação tipada.
+    
+    As colunas de baixa cardinalidade viram categóricas, a data vira datetime64
+    com a chave de mês 'yyyymm' (int32) pré-calculada e o valor passa a ter
+    também a coluna 'valor_centavos' (int64), que permite somas exatas.
+    
+    Args:
+        df: DataFrame com as colunas de COLUNAS, como lido do arquivo
+        
+    Returns:
+        DataFrame: Transações tipadas
+    """
+    datas = pd.to_datetime(df['data'], errors='coerce')
+    centavos = np.rint(pd.to_numeric(df['valor'], errors='coerce').fillna(0).to_numpy(dtype='float64') * 100)
+    
+    tipado = pd.DataFrame({
+        'id': pd.to_numeric(df['id']).astype('int64'),
+        'empresa': df['empresa'].astype('category'),
+        'data': datas,
+        'tipo': df['tipo'].astype('category'),
+        'descricao': df['descricao'].astype('category'),
+        'valor_centavos': centavos.astype('int64'),
+        # Meses inválidos (datas não reconhecidas) ficam com chave 0
+        'yyyymm': (datas.dt.year * 100 + datas.dt.month).fillna(0).astype('int32')
+    }, index=df.index)
+    tipado.insert(5, 'valor', tipado['valor_centavos'] / 100)
+    
+    return tipado
+
+def _assinatura_arquivos(*caminhos):
+    """Retorna (mtime, tamanho) de cada arquivo, ou None se ele não existir."""
+    assinatura = []
+    
+    for caminho in caminhos:
+        try:
+            info = os.stat(caminho)
+            assinatura.append((info.st_mtime_ns, info.st_size))
+        except FileNotFoundError:
+            assinatura.append(None)
+    
+    return tuple(assinatura)
+
+def _lotes_csv(caminhos, empresa=None, periodo=None, tamanho_lote=None):
+    """
+    Lê arquivos CSV de transações em lotes, aplicando os filtros a cada lote.
+    
+    Args:
+        caminhos: Arquivos lidos em sequência (os inexistentes ou vazios são ignorados)
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (inicio, fim) já normalizado (opcional)
+        tamanho_lote: Linhas lidas por vez
+    
+    Yields:
+        DataFrame: Lotes não vazios com as colunas de COLUNAS
+    """
+    # Colunas de texto com tipo fixo, para que todos os lotes tenham o mesmo formato
+    tipos = {'empresa': str, 'data': str, 'tipo': str, 'descricao': str}
+    
+    for caminho in caminhos:
+        if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+            continue
+        
+        with pd.read_csv(caminho, dtype=tipos, chunksize=tamanho_lote or TAMANHO_LOTE_LEITURA) as leitor:
+            for lote in leitor:
+                lote = filtrar(lote, empresa, periodo)
+                if not lote.empty:
+                    yield lote
+
+@contextmanager
+def _trava_arquivo(caminho, exclusiva=True):
+    """
+    Trava um arquivo de lock entre processos e threads.
+    
+    Args:
+        caminho: Caminho do arquivo de lock (criado se não existir)
+        exclusiva: True para trava exclusiva (escrita), False para compartilhada (leitura)
+    """
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    
+    with open(caminho, 'a+b') as arquivo:
+        if fcntl is not None:
+            fcntl.flock(arquivo.fileno(), fcntl.LOCK_EX if exclusiva else fcntl.LOCK_SH)
+        else:
+            # No Windows não há trava compartilhada; toda trava é exclusiva
+            arquivo.seek(0)
+            msvcrt.locking(arquivo.fileno(), msvcrt.LK_LOCK, 1)
+        
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(arquivo.fileno(), fcntl.LOCK_UN)
+            else:
+                arquivo.seek(0)
+                msvcrt.locking(arquivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+class CSVStorage:
+    """
+    Armazena as transações em CSV, com um log append-only (o segmento) para escritas.
+    
+    Cada escritor publica suas linhas como um arquivo pendente (gravado em um
+    temporário e renomeado atomicamente) e disputa a trava do log. Quem obtém
+    a trava grava no log, em uma única escrita com fsync, todos os pendentes
+    publicados até então, inclusive os de outros escritores (group commit).
+    Quem encontra suas linhas já gravadas apenas retorna.
+    
+    Os filtros são aplicados em memória após a leitura do arquivo completo.
+    """
+    
+    nome = "csv"
+    
+    # Os filtros não reduzem a leitura, então o cache guarda o arquivo completo
+    filtra_na_origem = False
+    
+    def __init__(self, caminho=None, segmento=None, limite_compactacao=None):
+        self.caminho = caminho or DATA_PATH
+        self.segmento = segmento or SEGMENT_PATH
+        self.limite_compactacao = limite_compactacao or COMPACTION_THRESHOLD
+        
+        # Trava do log e diretório dos lotes aguardando o group commit
+        self.trava = self.caminho + ".lock"
+        self.pendentes = self.caminho + ".pendentes"
+        
+        # Cubo mensal pré-agregado mantido junto com os dados
+        self.cubo = os.path.splitext(self.caminho)[0] + ".cubo.csv"
+        
+        # Último ID reservado, compartilhado entre os processos
+        self.ids = self.caminho + ".ids"
+        
+        # Blocos com a compactação automática adiada (veja adiar_compactacao)
+        self._adiamentos = 0
+        self._adiamentos_lock = threading.Lock()
+    
+    def inicializar(self):
+        """Cria o arquivo principal vazio se ele ainda não existir."""
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        
+        if not os.path.exists(self.caminho):
+            pd.DataFrame(columns=COLUNAS).to_csv(self.caminho, index=False)
+    
+    def _ler_arquivos(self):
+        """Lê o arquivo principal e o segmento (a trava deve estar com quem chama)."""
+        df = pd.read_csv(self.caminho)
+        
+        # Anexa as linhas gravadas no segmento desde a última compactação
+        if os.path.exists(self.segmento) and os.path.getsize(self.segmento) > 0:
+            segmento = pd.read_csv(self.segmento)
+            if not segmento.empty:
+                df = pd.concat([df, segmento], ignore_index=True) if not df.empty else segmento
+        
+        return df
+    
+    def carregar(self, empresa=None, periodo=None):
+        """
+        Carrega o arquivo principal e o segmento, aplicando os filtros.
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            
+        Returns:
+            DataFrame: Transações filtradas
+        """
+        with _trava_arquivo(self.trava, exclusiva=False):
+            df = self._ler_arquivos()
+        
+        return filtrar(df, empresa, periodo)
+    
+    def iterar(self, empresa=None, periodo=None, tamanho_lote=None):
+        """
+        Lê o arquivo principal e o segmento em lotes, sem carregá-los inteiros.
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            tamanho_lote: Linhas lidas por vez (padrão: TAMANHO_LOTE_LEITURA)
+        
+        Yields:
+            DataFrame: Lotes de transações filtradas
+        """
+        with _trava_arquivo(self.trava, exclusiva=False):
+            yield from _lotes_csv([self.caminho, self.segmento], empresa, periodo, tamanho_lote)
+    
+    def assinatura(self):
+        """Identifica o estado atual dos arquivos para invalidar o cache."""
+        return _assinatura_arquivos(self.caminho, self.segmento)
+    
+    def possui_dados(self):
+        """Indica se há ao menos uma transação gravada."""
+        return not self.carregar().empty
+    
+    def listar_ids(self):
+        """
+        Lista os IDs de todas as transações gravadas.
+        
+        Returns:
+            numpy.ndarray: IDs (int64)
+        """
+        caminhos = [self.caminho, self.segmento]
+        
+        # Lê só a coluna de IDs, sem carregar os demais campos
+        with _trava_arquivo(self.trava, exclusiva=False):
+            return np.concatenate([np.empty(0, dtype='int64')] + [
+                pd.read_csv(caminho, usecols=['id'])['id'].to_numpy(dtype='int64')
+                for caminho in caminhos
+                if os.path.exists(caminho) and os.path.getsize(caminho) > 0
+            ])
+    
+    def _publicar(self, df_novos):
+        """
+        Publica um lote como arquivo pendente, de forma atômica.
+        
+        Returns:
+            str: Caminho do arquivo pendente
+        """
+        os.makedirs(self.pendentes, exist_ok=True)
+        
+        # O nome começa pelo timestamp para preservar a ordem de chegada
+        nome = f"{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}-{next(_sequencia_lotes)}"
+        tmp_path = os.path.join(self.pendentes, nome + ".tmp")
+        caminho = os.path.join(self.pendentes, nome + ".csv")
+        
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as arquivo:
+            df_novos[COLUNAS].to_csv(arquivo, index=False, header=False)
+        os.replace(tmp_path, caminho)
+        
+        return caminho
+    
+    def _gravar_pendentes(self):
+        """
+        Grava no segmento todos os lotes pendentes (a trava exclusiva deve estar
+        com quem chama).
+        
+        Returns:
+            int: Número de lotes gravados
+        """
+        if not os.path.isdir(self.pendentes):
+            return 0
+        
+        lotes = sorted(nome for nome in os.listdir(self.pendentes) if nome.endswith(".csv"))
+        if not lotes:
+            return 0
+        
+        conteudo = []
+        for nome in lotes:
+            with open(os.path.join(self.pendentes, nome), 'rb') as arquivo:
+                conteudo.append(arquivo.read())
+        
+        # Escreve o cabeçalho apenas na criação do segmento
+        if not os.path.exists(self.segmento) or os.path.getsize(self.segmento) == 0:
+            conteudo.insert(0, (",".join(COLUNAS) + "\n").encode('utf-8'))
+        
+        # Uma única escrita e um único fsync para todos os lotes
+        with open(self.segmento, 'ab') as arquivo:
+            arquivo.write(b"".join(conteudo))
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        
+        # Só depois de duráveis no segmento os lotes deixam de estar pendentes
+        for nome in lotes:
+            os.remove(os.path.join(self.pendentes, nome))
+        
+        return len(lotes)
+    
+    def anexar(self, df_novos):
+        """
+        Anexa linhas ao segmento sem reescrever o arquivo principal.
+        
+        O custo da escrita depende apenas do número de linhas novas. Escritas
+        concorrentes são agrupadas em um único commit. Quando o segmento passa
+        do limite de compactação, ele é compactado (exceto dentro de
+        adiar_compactacao).
+        
+        Args:
+            df_novos: DataFrame com as colunas de COLUNAS
+        
+        Returns:
+            DataFrame: Linhas gravadas (todas as recebidas)
+        """
+        if df_novos.empty:
+            return df_novos
+        
+        lote = self._publicar(df_novos)
+        
+        with _trava_arquivo(self.trava):
+            # Se outro escritor já gravou este lote, não há nada a fazer
+            if os.path.exists(lote):
+                self._gravar_pendentes()
+            
+            if not self._adiamentos:
+                self._compactar_se_grande()
+        
+        return df_novos
+    
+    @contextmanager
+    def adiar_compactacao(self):
+        """
+        Adia a compactação automática enquanto o bloco executa.
+        
+        Usado em importações em massa: sem o adiamento, cada lote que passa do
+        limite reescreveria o arquivo principal inteiro. Ao final do bloco, o
+        segmento é compactado uma única vez, se tiver passado do limite.
+        """
+        with self._adiamentos_lock:
+            self._adiamentos += 1
+        
+        try:
+            yield
+        finally:
+            with self._adiamentos_lock:
+                self._adiamentos -= 1
+                restantes = self._adiamentos
+            
+            if not restantes:
+                with _trava_arquivo(self.trava):
+                    self._compactar_se_grande()
+    
+    def _compactar_se_grande(self):
+        """Compacta se o segmento passou do limite (a trava exclusiva deve estar com quem chama)."""
+        if os.path.exists(self.segmento) and os.path.getsize(self.segmento) >= self.limite_compactacao:
+            self._compactar()
+    
+    def _compactar(self):
+        """
+        Compacta o segmento (a trava exclusiva deve estar com quem chama).
+        
+        O arquivo principal e as linhas do segmento são copiados em blocos
+        para o arquivo temporário, sem carregar o livro em memória.
+        """
+        if not os.path.exists(self.segmento):
+            return 0
+        
+        if os.path.getsize(self.segmento) == 0:
+            os.remove(self.segmento)
+            return 0
+        
+        linhas = sum(len(lote) for lote in pd.read_csv(self.segmento, usecols=['id'], chunksize=TAMANHO_LOTE_LEITURA))
+        
+        # Arquivos com outra ordem de colunas (gravados por versões antigas)
+        # são reescritos com as colunas de COLUNAS
+        if list(pd.read_csv(self.caminho, nrows=0).columns) != COLUNAS:
+            self._reescrever()
+            return linhas
+        
+        # Reescreve o arquivo principal e só então remove o segmento
+        tmp_path = self.caminho + ".tmp"
+        with open(tmp_path, 'wb') as destino:
+            with open(self.caminho, 'rb') as principal:
+                shutil.copyfileobj(principal, destino)
+            
+            # Garante que a primeira linha do segmento comece em uma nova linha
+            if destino.tell() > 0:
+                with open(self.caminho, 'rb') as principal:
+                    principal.seek(-1, os.SEEK_END)
+                    if principal.read(1) != b"\n":
+                        destino.write(b"\n")
+            
+            # Linhas do segmento, sem o cabeçalho
+            with open(self.segmento, 'rb') as segmento:
+                segmento.readline()
+                shutil.copyfileobj(segmento, destino)
+            
+            destino.flush()
+            os.fsync(destino.fileno())
+        os.replace(tmp_path, self.caminho)
+        os.remove(self.segmento)
+        
+        return linhas
+    
+    def _reescrever(self):
+        """Reescreve o arquivo principal com o segmento incorporado (a trava exclusiva deve estar com quem chama)."""
+        df = self._ler_arquivos()
+        
+        tmp_path = self.caminho + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as arquivo:
+            df[COLUNAS].to_csv(arquivo, index=False)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        os.replace(tmp_path, self.caminho)
+        os.remove(self.segmento)
+    
+    def compactar(self):
+        """
+        Incorpora os lotes pendentes e o segmento ao arquivo principal.
+        
+        O arquivo principal é reescrito em um arquivo temporário e substituído
+        atomicamente, de modo que uma falha no meio não corrompe os dados.
+        
+        Returns:
+            int: Número de linhas incorporadas
+        """
+        with _trava_arquivo(self.trava):
+            self._gravar_pendentes()
+            return self._compactar()
+
+class SQLiteStorage:
+    """
+    Armazena as transações em um banco SQLite indexado por (empresa, data, tipo).
+    
+    Os filtros de empresa e período são executados pelo SQLite, que lê apenas
+    as linhas do intervalo pedido.
+    """
+    
+    nome = "sqlite"
+    
+    # Cada combinação de filtros é uma consulta distinta no cache
+    filtra_na_origem = True
+    
+    def __init__(self, caminho=None):
+        self.caminho = caminho or SQLITE_PATH
+        
+        # Cubo nomeado a partir do arquivo completo (user_data.db.cubo.csv), para
+        # não coincidir com o do CSV no mesmo diretório
+        self.cubo = self.caminho + ".cubo.csv"
+        
+        # Último ID reservado, compartilhado entre os processos
+        self.ids = self.caminho + ".ids"
+    
+    def _conectar(self):
+        return closing(sqlite3.connect(self.caminho, timeout=30))
+    
+    def inicializar(self):
+        """Cria o banco, a tabela e o índice se ainda não existirem."""
+        os.makedirs(os.path.dirname(self.caminho) or ".", exist_ok=True)
+        
+        with self._conectar() as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transacoes ("
+                "id INTEGER PRIMARY KEY, empresa TEXT NOT NULL, data TEXT NOT NULL, "
+                "tipo TEXT NOT NULL, descricao TEXT, valor REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_transacoes_empresa_data_tipo "
+                "ON transacoes (empresa, data, tipo)"
+            )
+    
+    def carregar(self, empresa=None, periodo=None):
+        """
+        Consulta as transações com os filtros aplicados em SQL.
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            
+        Returns:
+            DataFrame: Transações filtradas
+        """
+        sql, parametros = self._consulta(empresa, periodo)
+        
+        with self._conectar() as conn:
+            return pd.read_sql_query(sql, conn, params=parametros)
+    
+    def _consulta(self, empresa=None, periodo=None):
+        """Monta o SELECT das transações com os filtros como parâmetros."""
+        condicoes = []
+        parametros = []
+        
+        if empresa:
+            condicoes.append("empresa = ?")
+            parametros.append(empresa)
+        
+        if periodo:
+            condicoes.append("data BETWEEN ? AND ?")
+            parametros.extend(periodo)
+        
+        sql = f"SELECT {', '.join(COLUNAS)} FROM transacoes"
+        if condicoes:
+            sql += " WHERE " + " AND ".join(condicoes)
+        
+        return sql, parametros
+    
+    def iterar(self, empresa=None, periodo=None, tamanho_lote=None):
+        """
+        Consulta as transações em lotes de linhas (cursor do SQLite).
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            tamanho_lote: Linhas lidas por vez (padrão: TAMANHO_LOTE_LEITURA)
+        
+        Yields:
+            DataFrame: Lotes de transações filtradas
+        """
+        sql, parametros = self._consulta(empresa, periodo)
+        
+        with self._conectar() as conn:
+            for lote in pd.read_sql_query(sql, conn, params=parametros, chunksize=tamanho_lote or TAMANHO_LOTE_LEITURA):
+                if not lote.empty:
+                    yield lote
+    
+    def assinatura(self):
+        """Identifica o estado atual do banco (incluindo o WAL) para invalidar o cache."""
+        return _assinatura_arquivos(self.caminho, self.caminho + "-wal")
+    
+    def possui_dados(self):
+        """Indica se há ao menos uma transação gravada."""
+        with self._conectar() as conn:
+            return conn.execute("SELECT 1 FROM transacoes LIMIT 1").fetchone() is not None
+    
+    def listar_ids(self):
+        """
+        Lista os IDs de todas as transações gravadas.
+        
+        Returns:
+            numpy.ndarray: IDs (int64)
+        """
+        with self._conectar() as conn:
+            cursor = conn.execute("SELECT id FROM transacoes")
+            return np.fromiter((linha[0] for linha in cursor), dtype='int64')
+    
+    def anexar(self, df_novos):
+        """
+        Insere as linhas em uma única transação.
+        
+        Linhas cujo ID já está gravado (ou se repete no próprio lote) são
+        ignoradas, como no INSERT OR IGNORE.
+        
+        Args:
+            df_novos: DataFrame com as colunas de COLUNAS
+        
+        Returns:
+            DataFrame: Linhas efetivamente inseridas
+        """
+        df_novos = df_novos[COLUNAS].drop_duplicates(subset='id')
+        if df_novos.empty:
+            return df_novos
+        
+        with self._conectar() as conn, conn:
+            # A trava de escrita é tomada antes da consulta, para que nenhum
+            # outro processo grave os mesmos IDs entre a consulta e o INSERT
+            conn.execute("BEGIN IMMEDIATE")
+            
+            existentes = [linha[0] for linha in conn.execute(
+                "SELECT id FROM transacoes WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(df_novos['id'].astype('int64').tolist()),)
+            )]
+            df_novos = df_novos[~df_novos['id'].isin(existentes)]
+            
+            linhas = df_novos.astype(object).where(df_novos.notna(), None)
+            conn.executemany(
+                f"INSERT INTO transacoes ({', '.join(COLUNAS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                linhas.itertuples(index=False, name=None)
+            )
+        
+        return df_novos
+    
+    def compactar(self):
+        """
+        Reorganiza o banco em disco. As escritas no SQLite não geram segmento.
+        
+        Returns:
+            int: Sempre 0 (nenhuma linha pendente de incorporação)
+        """
+        with self._conectar() as conn:
+            conn.execute("VACUUM")
+        
+        return 0
+
+    def adiar_compactacao(self):
+        """O SQLite não compacta durante as escritas; não há o que adiar."""
+        return nullcontext()
+
+class PartitionedStorage:
+    """
+    Armazena as transações em um CSV por empresa e mês.
+    
+    O layout é <diretorio>/<empresa>/<YYYY-MM>.csv, com o nome da empresa
+    codificado para URL. Consultas abrem apenas as partições da empresa e dos
+    meses que se sobrepõem ao período pedido.
+    """
+    
+    nome = "particionado"
+    
+    # A poda de partições depende dos filtros, então cada consulta é cacheada
+    filtra_na_origem = True
+    
+    def __init__(self, diretorio=None):
+        self.diretorio = diretorio or PARTITIONS_PATH
+        
+        # Arquivo tocado a cada escrita, usado como assinatura do cache
+        self.manifesto = os.path.join(self.diretorio, "_versao")
+        self.cubo = os.path.join(self.diretorio, "_cubo.csv")
+        self.ids = os.path.join(self.diretorio, "_ids")
+        
+        # Trava que serializa as escritas entre processos
+        self.trava = os.path.join(self.diretorio, "_lock")
+    
+    def inicializar(self):
+        """Cria o diretório das partições se ele ainda não existir."""
+        os.makedirs(self.diretorio, exist_ok=True)
+    
+    def _particoes(self, empresa=None, periodo=None):
+        """
+        Lista os arquivos de partição que podem conter linhas do filtro.
+        
+        Args:
+            empresa: Nome da empresa (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            
+        Returns:
+            list: Caminhos das partições selecionadas
+        """
+        if not os.path.isdir(self.diretorio):
+            return []
+        
+        if empresa:
+            pastas = [quote(empresa, safe='')]
+        else:
+            pastas = sorted(
+                nome for nome in os.listdir(self.diretorio)
+                if os.path.isdir(os.path.join(self.diretorio, nome))
+            )
+        
+        # Meses inicial e final do período (YYYY-MM)
+        if periodo:
+            mes_inicio, mes_fim = periodo[0][:7], periodo[1][:7]
+        
+        caminhos = []
+        for pasta in pastas:
+            caminho_pasta = os.path.join(self.diretorio, pasta)
+            if not os.path.isdir(caminho_pasta):
+                continue
+            
+            for arquivo in sorted(os.listdir(caminho_pasta)):
+                if not arquivo.endswith(".csv"):
+                    continue
+                mes = arquivo[:-len(".csv")]
+                if periodo and not (mes_inicio <= mes <= mes_fim):
+                    continue
+                caminhos.append(os.path.join(caminho_pasta, arquivo))
+        
+        return caminhos
+    
+    def carregar(self, empresa=None, periodo=None):
+        """
+        Lê apenas as partições que se sobrepõem aos filtros.
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            
+        Returns:
+            DataFrame: Transações filtradas
+        """
+        with _trava_arquivo(self.trava, exclusiva=False):
+            partes = [pd.read_csv(caminho) for caminho in self._particoes(empresa, periodo)]
+        partes = [parte for parte in partes if not parte.empty]
+        
+        if not partes:
+            return pd.DataFrame(columns=COLUNAS)
+        
+        df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+        
+        # Os meses das bordas do período podem ter dias fora do intervalo
+        return filtrar(df, None, periodo)
+    
+    def iterar(self, empresa=None, periodo=None, tamanho_lote=None):
+        """
+        Lê em lotes apenas as partições que se sobrepõem aos filtros.
+        
+        Args:
+            empresa: Nome da empresa para filtrar (opcional)
+            periodo: Tuple (inicio, fim) já normalizado (opcional)
+            tamanho_lote: Linhas lidas por vez (padrão: TAMANHO_LOTE_LEITURA)
+        
+        Yields:
+            DataFrame: Lotes de transações filtradas
+        """
+        with _trava_arquivo(self.trava, exclusiva=False):
+            yield from _lotes_csv(self._particoes(empresa, periodo), None, periodo, tamanho_lote)
+    
+    def assinatura(self):
+        """Identifica a última escrita nas partições para invalidar o cache."""
+        return _assinatura_arquivos(self.manifesto)
+    
+    def possui_dados(self):
+        """Indica se há ao menos uma partição gravada."""
+        return bool(self._particoes())
+    
+    def listar_ids(self):
+        """
+        Lista os IDs de todas as transações gravadas.
+        
+        Returns:
+            numpy.ndarray: IDs (int64)
+        """
+        return np.concatenate([np.empty(0, dtype='int64')] + [
+            pd.read_csv(caminho, usecols=['id'])['id'].to_numpy(dtype='int64')
+            for caminho in self._particoes()
+        ])
+    
+    def anexar(self, df_novos):
+        """
+        Anexa cada linha ao final da partição da sua empresa e mês.
+        
+        As datas são interpretadas como na importação (utils.formatters.
+        interpretar_datas) e gravadas como AAAA-MM-DD, de modo que a partição
+        sempre corresponde ao mês da data.
+        
+        Args:
+            df_novos: DataFrame com as colunas de COLUNAS
+        
+        Returns:
+            DataFrame: Linhas gravadas (todas as recebidas)
+        
+        Raises:
+            ValueError: Se alguma linha não tiver empresa ou tiver data não
+                reconhecida (nada é gravado)
+        """
+        if df_novos.empty:
+            return df_novos
+        
+        # Empresa e data definem a partição: sem elas a linha seria descartada
+        # pelo agrupamento ou iria para uma partição inválida
+        _, erros = validar_lancamentos(df_novos)
+        erros = erros & (ERRO_EMPRESA_VAZIA | ERRO_DATA_INVALIDA)
+        if erros.any():
+            descricoes = descrever_erros(erros[erros > 0])
+            raise ValueError(
+                f"{len(descricoes)} transação(ões) sem partição válida: "
+                + "; ".join(f"linha {indice}: {texto}" for indice, texto in descricoes.head(10).items())
+            )
+        
+        datas = interpretar_datas(df_novos['data'])
+        df_novos = df_novos[COLUNAS].assign(data=datas.dt.strftime('%Y-%m-%d'))
+        meses = datas.dt.strftime('%Y-%m')
+        
+        with _trava_arquivo(self.trava):
+            for (empresa, mes), linhas in df_novos.groupby([df_novos['empresa'], meses], sort=False):
+                pasta = os.path.join(self.diretorio, quote(str(empresa), safe=''))
+                os.makedirs(pasta, exist_ok=True)
+                
+                caminho = os.path.join(pasta, f"{mes}.csv")
+                linhas.to_csv(caminho, mode='a', header=not os.path.exists(caminho), index=False)
+            
+            # Atualiza o manifesto para sinalizar a escrita
+            with open(self.manifesto, 'a'):
+                os.utime(self.manifesto)
+        
+        return df_novos
+    
+    def compactar(self):
+        """
+        As partições já são gravadas no lugar definitivo; não há o que compactar.
+        
+        Returns:
+            int: Sempre 0
+        """
+        return 0
+    
+    def adiar_compactacao(self):
+        """As partições não são compactadas; não há o que adiar."""
+        return nullcontext()
+
+# Backends disponíveis, selecionáveis pela variável de ambiente DRE_STORAGE
+BACKENDS = {
+    CSVStorage.nome: CSVStorage,
+    SQLiteStorage.nome: SQLiteStorage,
+    PartitionedStorage.nome: PartitionedStorage
+}
+
+# Backend em uso (criado sob demanda por get_storage)
+_storage = None
+
+def configurar_armazenamento(backend):
+    """
+    Define o backend de armazenamento usado pelo módulo.
+    
+    Args:
+        backend: Nome de um backend em BACKENDS ou uma instância já configurada
+        
+    Returns:
+        O backend configurado
+    """
+    global _storage
+    
+    if isinstance(backend, str):
+        if backend not in BACKENDS:
+            raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+        backend = BACKENDS[backend]()
+    
+    _storage = backend
+    limpar_cache()
+    return _storage
+
+def get_storage():
+    """Retorna o backend em uso, criando o padrão na primeira chamada."""
+    if _storage is None:
+        configurar_armazenamento(os.environ.get("DRE_STORAGE", CSVStorage.nome))
+    
+    return _storage
+
+def limpar_cache():
+    """Descarta todas as leituras em cache."""
+    with _cache_lock:
+        _cache_leituras.clear()
+
+def _registrar_escrita():
+    """Incrementa a versão de escrita, invalidando as leituras em cache."""
+    global _versao_escrita
+    
+    with _cache_lock:
+        _versao_escrita += 1
+        _cache_leituras.clear()
+        ouvintes = list(_ouvintes_escrita)
+    
+    for ouvinte in ouvintes:
+        ouvinte()
+
+def registrar_invalidacao(funcao):
+    """
+    Registra uma função a ser chamada sempre que os dados forem alterados.
+    
+    Args:
+        funcao: Função sem argumentos que descarta o cache dependente dos dados
+    """
+    with _cache_lock:
+        if funcao not in _ouvintes_escrita:
+            _ouvintes_escrita.append(funcao)
+
+def versao_dados():
+    """
+    Retorna um identificador do estado atual dos dados.
+    
+    Muda a cada escrita deste processo e quando os arquivos do backend são
+    alterados por outro processo.
+    
+    Returns:
+        tuple: (backend, versão de escrita, assinatura dos arquivos)
+    """
+    storage = get_storage()
+    return storage.nome, _versao_escrita, storage.assinatura()
+
+def _marcar_origem(df, versao, fonte, empresa=None, periodo=None):
+    """
+    Registra de onde o DataFrame veio e em qual versão dos dados.
+    
+    A marca fica associada ao próprio objeto (e não a df.attrs, que o pandas
+    copia para os DataFrames derivados), então só vale para o DataFrame
+    entregue ao chamador. Ela é usada como chave pelo cache de calcular_dre.
+    
+    Args:
+        df: DataFrame retornado ao chamador
+        versao: Versão dos dados obtida antes da leitura (veja versao_dados)
+        fonte: 'transacoes' ou 'cubo'
+        empresa: Filtro de empresa aplicado (opcional)
+        periodo: Período normalizado aplicado (opcional)
+    
+    Returns:
+        DataFrame: O próprio df
+    """
+    chave = id(df)
+    referencia = weakref.ref(df, lambda _, chave=chave: _origens.pop(chave, None))
+    _origens[chave] = (referencia, (versao, fonte, empresa or None, periodo))
+    
+    return df
+
+def origem_dados(df):
+    """
+    Retorna a origem de um DataFrame entregue por get_transactions ou get_cubo.
+    
+    Args:
+        df: DataFrame qualquer
+    
+    Returns:
+        tuple: (versão dos dados, fonte, empresa, período), ou None se df não
+        for um DataFrame entregue pelo data_manager (por exemplo, uma cópia ou
+        um DataFrame derivado dele)
+    """
+    item = _origens.get(id(df))
+    if item is not None and item[0]() is df:
+        return item[1]
+    
+    return None
+
+def _ler_com_cache(storage, empresa=None, periodo=None):
+    """
+    Lê do backend reaproveitando o resultado enquanto os dados não mudarem.
+    
+    Args:
+        storage: Backend de armazenamento
+        empresa: Filtro de empresa repassado ao backend (opcional)
+        periodo: Período normalizado repassado ao backend (opcional)
+        
+    Returns:
+        tuple: (versão, DataFrame) com a versão dos dados (a de versao_dados)
+        obtida antes da leitura e o resultado tipado em cache (não deve ser
+        modificado)
+    """
+    chave = (storage.nome, empresa, periodo)
+    
+    # A versão é obtida antes da leitura: uma escrita feita no meio por outro
+    # processo deixa o resultado com a versão anterior, e não com a nova
+    versao = (storage.nome, _versao_escrita, storage.assinatura())
+    
+    with _cache_lock:
+        item = _cache_leituras.get(chave)
+        if item is not None and item[0] == versao:
+            _cache_leituras.move_to_end(chave)
+            return item
+    
+    df = indexar(tipar_transacoes(storage.carregar(empresa, periodo)))
+    
+    with _cache_lock:
+        _cache_leituras[chave] = (versao, df)
+        _cache_leituras.move_to_end(chave)
+        while len(_cache_leituras) > CACHE_MAX_ENTRADAS:
+            _cache_leituras.popitem(last=False)
+    
+    return versao, df
+
+def initialize_data():
+    """
+    Inicializa o armazenamento de dados se não existir.
+    Retorna um DataFrame vazio ou carrega o existente.
+    """
+    storage = get_storage()
+    storage.inicializar()
+    
+    return _ler_com_cache(storage)[1]
+
+def compactar_dados():
+    """
+    Incorpora as escritas pendentes ao armazenamento principal.
+    
+    Returns:
+        int: Número de linhas incorporadas
+    """
+    storage = get_storage()
+    total = storage.compactar()
+    compactar_cubo(storage)
+    _registrar_escrita()
+    
+    return total
+
+def migrar_csv(destino, origem=None, tamanho_lote=50_000):
+    """
+    Copia as transações do CSV (arquivo principal e segmento) para outro backend.
+    
+    No SQLite, IDs já presentes no banco são ignorados, então a migração pode
+    ser repetida com segurança.
+    
+    Args:
+        destino: Nome de um backend em BACKENDS ou uma instância já configurada
+        origem: Caminho do CSV (padrão: DATA_PATH)
+        tamanho_lote: Número de linhas lidas e gravadas por vez
+        
+    Returns:
+        int: Número de linhas lidas do CSV
+    """
+    origem = origem or DATA_PATH
+    segmento = os.path.splitext(origem)[0] + ".segment.csv"
+    
+    if isinstance(destino, str):
+        destino = BACKENDS[destino]()
+    destino.inicializar()
+    
+    total = 0
+    for caminho in (origem, segmento):
+        if not os.path.exists(caminho):
+            continue
+        
+        for lote in pd.read_csv(caminho, chunksize=tamanho_lote):
+            destino.anexar(lote)
+            total += len(lote)
+    
+    # O cubo do destino é recalculado a partir dos dados migrados
+    reconstruir_cubo(destino)
+    
+    return total
+
+def migrar_csv_para_sqlite(origem=None, destino=None, tamanho_lote=50_000):
+    """
+    Copia as transações do CSV para o banco SQLite.
+    
+    Args:
+        origem: Caminho do CSV (padrão: DATA_PATH)
+        destino: Caminho do banco SQLite (padrão: SQLITE_PATH)
+        tamanho_lote: Número de linhas lidas e inseridas por vez
+        
+    Returns:
+        int: Número de linhas lidas do CSV
+    """
+    return migrar_csv(SQLiteStorage(destino), origem, tamanho_lote)
+
+def _gravar(storage, df_novos):
+    """
+    Grava novas transações no backend e soma sua contribuição ao cubo mensal.
+    
+    Só as linhas que o backend de fato gravou entram no cubo (o SQLite ignora
+    IDs já existentes).
+    
+    Args:
+        storage: Backend de armazenamento
+        df_novos: DataFrame com as colunas de COLUNAS
+    
+    Raises:
+        ValueError: Se alguma linha foi recusada por ter um ID já gravado (as
+            demais linhas permanecem gravadas)
+    """
+    gravadas = storage.anexar(df_novos)
+    if not gravadas.empty:
+        _anexar_cubo(storage, _agregar_cubo(gravadas))
+
+    recusadas = len(df_novos) - len(gravadas)
+    if recusadas:
+        ids = df_novos['id'].astype('int64')
+        repetidos = ids[ids.duplicated() | ~ids.isin(gravadas['id'].astype('int64'))].unique()
+        raise ValueError(f"{recusadas} transação(ões) não gravada(s): IDs já existentes {sorted(repetidos)[:10]}")
+
+def _gerar_ids(quantidade, storage=None):
     """
-    Inicializa o arquivo de dados se não existir.
-    Retorna um DataFrame vazio ou carrega o existente.
+    Gera IDs únicos e crescentes baseados no timestamp em microssegundos.
+    
+    A faixa é reservada sob a trava do arquivo de IDs do backend, que guarda
+    o último ID reservado por qualquer processo, então dois processos nunca
+    recebem o mesmo ID, mesmo no mesmo microssegundo.
+    
+    Args:
+        quantidade: Número de IDs a gerar
+        storage: Backend de armazenamento (padrão: o backend em uso)
+        
+    Returns:
+        list: IDs gerados
     """
-    # Cria o diretório data se não existir
-    os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
+    global _ultimo_id
     
-    # Verifica se o arquivo existe
-    if not os.path.exists(DATA_PATH):
-        # Cria um DataFrame vazio com as colunas necessárias
-        df = pd.DataFrame(columns=[
-            'id', 'empresa', 'data', 'tipo', 'descricao', 'valor'
-        ])
-        # Salva o DataFrame vazio como CSV
-        df.to_csv(DATA_PATH, index=False)
-        return df
+    storage = storage or get_storage()
+    
+    with _ids_lock, _trava_arquivo(storage.ids + ".lock"):
+        ultimo = _ultimo_id
+        if os.path.exists(storage.ids):
+            with open(storage.ids, encoding='utf-8') as arquivo:
+                ultimo = max(ultimo, int(arquivo.read().strip() or 0))
+        
+        base = max(int(datetime.now().timestamp() * 1_000_000), ultimo + 1)
+        _ultimo_id = base + quantidade - 1
+        
+        tmp_path = storage.ids + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as arquivo:
+            arquivo.write(str(_ultimo_id))
+        os.replace(tmp_path, storage.ids)
+    
+    return list(range(base, base + quantidade))
+
+def _completar_ids(df):
+    """
+    Gera IDs para as linhas sem 'id' (ou para todas, se a coluna não existir).
+    
+    Args:
+        df: DataFrame com as transações
+        
+    Returns:
+        DataFrame: Transações com a coluna 'id' preenchida (int64)
+    """
+    if 'id' not in df.columns:
+        return df.assign(id=_gerar_ids(len(df)))
+    
+    df = df.copy()
+    sem_id = df['id'].isna()
+    if sem_id.any():
+        df.loc[sem_id, 'id'] = _gerar_ids(int(sem_id.sum()))
+    df['id'] = df['id'].astype('int64')
     
-    # Carrega o arquivo existente
-    return pd.read_csv(DATA_PATH)
+    return df
 
 def add_transaction(empresa, data, tipo, descricao, valor):
     """
@@ -40,11 +1172,8 @@ def add_transaction(empresa, data, tipo, descricao, valor):
     Returns:
         int: ID da transação
     """
-    # Carrega os dados existentes
-    df = pd.read_csv(DATA_PATH)
-    
     # Gera ID único baseado no timestamp
-    transaction_id = int(datetime.now().timestamp())
+    transaction_id = _gerar_ids(1)[0]
     
     # Cria nova linha
     new_row = {
@@ -56,12 +1185,45 @@ def add_transaction(empresa, data, tipo, descricao, valor):
         'valor': valor
     }
     
-    # Adiciona ao DataFrame e salva
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(DATA_PATH, index=False)
+    # Anexa ao armazenamento (sem reler nem reescrever os dados existentes)
+    _gravar(get_storage(), pd.DataFrame([new_row]))
+    _registrar_escrita()
     
     return transaction_id
 
+def add_transactions(transacoes):
+    """
+    Adiciona várias transações com uma única escrita.
+    
+    Args:
+        transacoes: DataFrame ou iterável de linhas (dicts com as chaves de
+            COLUNAS ou tuplas na ordem empresa, data, tipo, descricao, valor).
+            Linhas sem 'id' recebem IDs gerados.
+        
+    Returns:
+        list: IDs das transações adicionadas
+    """
+    if isinstance(transacoes, pd.DataFrame):
+        df = transacoes
+    else:
+        linhas = list(transacoes)
+        if linhas and isinstance(linhas[0], dict):
+            df = pd.DataFrame(linhas)
+        else:
+            df = pd.DataFrame(linhas, columns=COLUNAS[1:])
+    
+    if df.empty:
+        return []
+    
+    # Gera IDs para as linhas que não possuem
+    df = _completar_ids(df)
+    
+    # Uma única escrita para todo o lote
+    _gravar(get_storage(), df)
+    _registrar_escrita()
+    
+    return df['id'].tolist()
+
 def get_transactions(empresa=None, periodo=None):
     """
     Recupera transações com filtros opcionais.
@@ -71,107 +1233,730 @@ def get_transactions(empresa=None, periodo=None):
         periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
         
     Returns:
-        DataFrame: Transações filtradas
+        DataFrame: Transações filtradas, na representação de tipar_transacoes.
+        O resultado vem do cache de leitura e é compartilhado entre chamadas,
+        portanto não deve ser modificado.
+    """
+    storage = get_storage()
+    periodo = normalizar_periodo(periodo)
+    
+    # No SQLite os filtros são executados pelo banco
+    if storage.filtra_na_origem:
+        versao, df = _ler_com_cache(storage, empresa, periodo)
+    else:
+        # Nos demais backends, filtra a partir do arquivo completo em cache
+        versao, df = _ler_com_cache(storage)
+        df = filtrar(df, empresa, periodo)
+    
+    return _marcar_origem(df, versao, 'transacoes', empresa, periodo)
+
+def iterar_transacoes(empresa=None, periodo=None, tamanho_lote=None, fonte=None):
+    """
+    Percorre as transações em lotes, sem carregar o histórico inteiro.
+    
+    Usado em livros maiores que a memória: cada lote é lido, entregue e
+    descartado. As leituras não passam pelo cache.
+    
+    Args:
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        tamanho_lote: Linhas lidas por vez (padrão: TAMANHO_LOTE_LEITURA)
+        fonte: Backend (instância) ou caminho a ler: um diretório de partições,
+            um banco SQLite (.db) ou um arquivo CSV (padrão: o backend em uso)
+    
+    Yields:
+        DataFrame: Lotes com as colunas de COLUNAS, como gravados
+    """
+    periodo = normalizar_periodo(periodo)
+    
+    if fonte is None:
+        fonte = get_storage()
+    elif isinstance(fonte, str):
+        if os.path.isdir(fonte):
+            fonte = PartitionedStorage(fonte)
+        elif fonte.endswith((".db", ".sqlite")):
+            fonte = SQLiteStorage(fonte)
+        else:
+            # Arquivo CSV avulso (por exemplo, um histórico arquivado)
+            yield from _lotes_csv([fonte], empresa, periodo, tamanho_lote)
+            return
+    
+    yield from fonte.iterar(empresa, periodo, tamanho_lote)
+
+def _posicoes_ordenadas(chaves, inicio, fim, decrescente=False):
+    """
+    Posições das linhas inicio..fim-1 na ordem de (chave, posição), sem ordenar tudo.
+    
+    Só as fim primeiras linhas são ordenadas: np.partition encontra a chave
+    da última delas e apenas as linhas até essa chave (inclusive empates)
+    passam pelo lexsort. Chaves NaN ficam sempre no fim.
+    
+    Args:
+        chaves: Array float64 com a chave de cada linha
+        inicio, fim: Intervalo da página na ordem final
+        decrescente: Ordem decrescente de chave (e de posição nos empates)
+    
+    Returns:
+        numpy.ndarray: Posições das linhas da página
+    """
+    total = len(chaves)
+    fim = min(fim, total)
+    if inicio >= fim:
+        return np.empty(0, dtype='int64')
+    
+    # Ordem crescente de (ordem, desempate) equivale à ordem pedida
+    ordem = -chaves if decrescente else chaves.copy()
+    ordem[np.isnan(ordem)] = np.inf
+    posicoes = np.arange(total)
+    desempate = -posicoes if decrescente else posicoes
+    
+    if fim < total:
+        limite = np.partition(ordem, fim - 1)[fim - 1]
+        posicoes = np.flatnonzero(ordem <= limite)
+    
+    selecionadas = posicoes[np.lexsort((desempate[posicoes], ordem[posicoes]))]
+    return selecionadas[inicio:fim]
+
+def consultar_transacoes(empresa=None, tipo=None, periodo=None, ordenar_por='data', decrescente=True, offset=0, limit=10):
+    """
+    Retorna uma página de transações filtradas e ordenadas.
+    
+    A página é montada por seleção das offset + limit primeiras linhas, sem
+    ordenar o livro inteiro. Com uma única empresa e ordenação por data, o
+    resultado de get_transactions já está em ordem (índice por empresa e
+    data) e a página é só uma fatia.
+    
+    Args:
+        empresa: Nome da empresa para filtrar (opcional)
+        tipo: Tipo de lançamento para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        ordenar_por: Uma das ORDENACOES; empates seguem a ordem das linhas
+        decrescente: Se True, as maiores chaves (datas mais recentes) primeiro
+        offset: Número de linhas puladas
+        limit: Número máximo de linhas da página
+    
+    Returns:
+        tuple: (página com as colunas de COLUNAS, total de linhas filtradas)
+    """
+    if ordenar_por not in ORDENACOES:
+        raise ValueError(f"Ordenação inválida: {ordenar_por!r}. Use uma de {ORDENACOES}.")
+    
+    df = get_transactions(empresa, periodo)
+    if tipo:
+        df = df[df['tipo'] == tipo]
+    
+    total = len(df)
+    inicio = max(0, offset)
+    fim = min(total, inicio + max(0, limit))
+    
+    if ordenar_por == 'data' and empresa and not tipo:
+        # Bloco de uma empresa já ordenado por data (datas inválidas no fim)
+        validas = int(df['data'].notna().sum())
+        if decrescente:
+            posicoes = np.concatenate([np.arange(validas - 1, -1, -1), np.arange(total - 1, validas - 1, -1)])[inicio:fim]
+        else:
+            posicoes = np.arange(inicio, fim)
+    else:
+        if ordenar_por == 'data':
+            dias = df['data'].to_numpy(dtype='datetime64[D]')
+            chaves = np.where(np.isnat(dias), np.nan, dias.astype('int64'))
+        else:
+            chaves = df[ordenar_por].to_numpy(dtype='float64', na_value=np.nan)
+        posicoes = _posicoes_ordenadas(chaves, inicio, fim, decrescente)
+    
+    return df.iloc[posicoes][COLUNAS], total
+
+def possui_transacoes():
+    """
+    Indica se há alguma transação gravada, sem carregar o histórico.
+    
+    Returns:
+        bool: True se existir ao menos uma transação
+    """
+    storage = get_storage()
+    
+    # No CSV o arquivo completo já fica em cache para as demais leituras
+    if not storage.filtra_na_origem:
+        return not _ler_com_cache(storage)[1].empty
+    
+    return storage.possui_dados()
+
+def _agregar_cubo(df):
     """
-    # Carrega os dados
-    df = pd.read_csv(DATA_PATH)
+    Soma as transações por empresa, mês, tipo e descrição.
     
-    # Se não houver dados, retorna DataFrame vazio
+    Args:
+        df: DataFrame com as transações (bruto ou tipado)
+        
+    Returns:
+        DataFrame: Células do cubo com as colunas de COLUNAS_CUBO
+    """
     if df.empty:
-        return df
+        return pd.DataFrame(columns=COLUNAS_CUBO)
+    
+    tipado = df if 'valor_centavos' in df.columns else tipar_transacoes(df)
+    tipado = tipado[tipado['yyyymm'] > 0]
+    
+    return (
+        tipado.groupby(DIMENSOES_CUBO, observed=True, dropna=False)['valor_centavos']
+        .sum()
+        .reset_index()
+    )
+
+def _anexar_cubo(storage, delta):
+    """
+    Anexa as somas de um lote ao arquivo do cubo, sem reescrevê-lo.
+    
+    Cada célula pode aparecer várias vezes no arquivo; as linhas repetidas são
+    somadas na leitura e fundidas pela compactação.
+    
+    Args:
+        storage: Backend de armazenamento dono do cubo
+        delta: Células a somar, com as colunas de COLUNAS_CUBO
+    """
+    if delta.empty:
+        return
+    
+    with _trava_arquivo(storage.cubo + ".lock"):
+        novo_cubo = not os.path.exists(storage.cubo) or os.path.getsize(storage.cubo) == 0
+        delta[COLUNAS_CUBO].to_csv(storage.cubo, mode='a', header=novo_cubo, index=False)
+
+def _ler_cubo(caminho):
+    """Lê o arquivo do cubo e soma as linhas repetidas de cada célula."""
+    bruto = pd.read_csv(
+        caminho,
+        dtype={'empresa': str, 'tipo': str, 'descricao': str, 'yyyymm': 'int32', 'valor_centavos': 'int64'},
+        keep_default_na=False
+    )
+    consolidado = (
+        bruto.groupby(DIMENSOES_CUBO, sort=True)['valor_centavos']
+        .sum()
+        .reset_index()
+    )
     
-    # Aplica filtro de empresa
-    if empresa:
-        df = df[df['empresa'] == empresa]
+    return consolidado, len(bruto)
+
+def _gravar_cubo(caminho, cubo):
+    """Substitui o arquivo do cubo de forma atômica."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    
+    tmp_path = caminho + ".tmp"
+    cubo[COLUNAS_CUBO].to_csv(tmp_path, index=False)
+    os.replace(tmp_path, caminho)
+
+def reconstruir_cubo(storage=None):
+    """
+    Recalcula o cubo mensal a partir de todas as transações gravadas.
     
-    # Aplica filtro de período
-    if periodo and len(periodo) == 2:
-        # Converte datas para string se forem objetos datetime
-        inicio = periodo[0]
-        fim = periodo[1]
+    Args:
+        storage: Backend de armazenamento (padrão: o backend em uso)
         
-        if hasattr(inicio, 'strftime'):
-            inicio = inicio.strftime('%Y-%m-%d')
+    Returns:
+        int: Número de células do cubo
+    """
+    storage = storage or get_storage()
+    
+    with _trava_arquivo(storage.cubo + ".lock"):
+        cubo = _agregar_cubo(storage.carregar())
+        _gravar_cubo(storage.cubo, cubo)
+    
+    return len(cubo)
+
+def compactar_cubo(storage=None):
+    """
+    Funde as linhas repetidas do cubo em uma linha por célula.
+    
+    Args:
+        storage: Backend de armazenamento (padrão: o backend em uso)
         
-        if hasattr(fim, 'strftime'):
-            fim = fim.strftime('%Y-%m-%d')
+    Returns:
+        int: Número de linhas removidas
+    """
+    storage = storage or get_storage()
+    
+    with _trava_arquivo(storage.cubo + ".lock"):
+        if not os.path.exists(storage.cubo):
+            return 0
         
-        df = df[(df['data'] >= inicio) & (df['data'] <= fim)]
+        cubo, linhas = _ler_cubo(storage.cubo)
+        if linhas > len(cubo):
+            _gravar_cubo(storage.cubo, cubo)
+    
+    return linhas - len(cubo)
+
+def carregar_cubo():
+    """
+    Carrega o cubo mensal consolidado do backend em uso.
+    
+    O resultado fica em cache até o arquivo do cubo mudar. Se o cubo ainda não
+    existir (dados gravados antes dele), é reconstruído a partir do histórico.
+    
+    Returns:
+        DataFrame: Uma linha por (empresa, yyyymm, tipo, descricao), com
+        'valor_centavos' (int64) e 'valor' (float). Não deve ser modificado.
+    """
+    storage = get_storage()
+    
+    if not os.path.exists(storage.cubo):
+        reconstruir_cubo(storage)
+    
+    assinatura = _assinatura_arquivos(storage.cubo)
+    with _cache_lock:
+        item = _cache_cubo.get(storage.cubo)
+        if item is not None and item[0] == assinatura:
+            return item[1]
+    
+    with _trava_arquivo(storage.cubo + ".lock", exclusiva=False):
+        cubo, linhas = _ler_cubo(storage.cubo)
+    
+    # Muitas linhas repetidas: funde o arquivo para as próximas leituras
+    if linhas > 2 * len(cubo) + 1000:
+        compactar_cubo(storage)
+        assinatura = _assinatura_arquivos(storage.cubo)
+    
+    for coluna in ('empresa', 'tipo', 'descricao'):
+        cubo[coluna] = cubo[coluna].astype('category')
+    cubo['valor'] = cubo['valor_centavos'] / 100
+    cubo = indexar(cubo, 'yyyymm')
+    
+    with _cache_lock:
+        _cache_cubo[storage.cubo] = (assinatura, cubo)
+    
+    return cubo
+
+def get_cubo(empresa=None, periodo=None):
+    """
+    Recupera as somas mensais do cubo com filtros opcionais.
+    
+    Os meses inteiramente contidos no período vêm do cubo. Os meses das bordas,
+    quando cobertos só em parte, são agregados a partir das transações desses
+    meses, de modo que o resultado é igual ao de agregar o período inteiro.
+    
+    Args:
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        
+    Returns:
+        DataFrame: Células do cubo (COLUNAS_CUBO mais 'valor'), aceitas por
+        calcular_dre e criar_grafico_distribuicao_despesas
+    """
+    # Versão obtida antes de ler o cubo e as transações das bordas
+    versao = versao_dados()
+    cubo = filtrar(carregar_cubo(), empresa)
+    
+    periodo = normalizar_periodo(periodo)
+    if not periodo:
+        return _marcar_origem(cubo, versao, 'cubo', empresa, periodo)
+    
+    inicio, fim = pd.Timestamp(periodo[0]), pd.Timestamp(periodo[1])
+    if inicio > fim:
+        return _marcar_origem(cubo.iloc[:0], versao, 'cubo', empresa, periodo)
+    
+    mes_inicio, mes_fim = inicio.to_period('M'), fim.to_period('M')
+    
+    # Meses cobertos por inteiro pelo período
+    primeiro_completo = mes_inicio if inicio == mes_inicio.start_time.normalize() else mes_inicio + 1
+    ultimo_completo = mes_fim if fim.normalize() == mes_fim.end_time.normalize() else mes_fim - 1
+    
+    partes = [filtrar(cubo, periodo=(primeiro_completo.start_time, ultimo_completo.end_time))]
+    
+    # Meses das bordas, agregados a partir das transações
+    for mes in sorted({mes_inicio, mes_fim}):
+        if primeiro_completo <= mes <= ultimo_completo:
+            continue
+        
+        inicio_borda = max(inicio, mes.start_time)
+        fim_borda = min(fim, mes.end_time.normalize())
+        borda = _agregar_cubo(get_transactions(empresa, (inicio_borda, fim_borda)))
+        partes.append(borda.assign(valor=borda['valor_centavos'] / 100))
+    
+    # Partes vazias não entram no concat (e não alteram os tipos do resultado)
+    partes = [parte for parte in partes if not parte.empty] or partes[:1]
+    if len(partes) == 1:
+        return _marcar_origem(partes[0], versao, 'cubo', empresa, periodo)
+    
+    resultado = pd.concat(partes, ignore_index=True)
+    for coluna in ('empresa', 'tipo', 'descricao'):
+        resultado[coluna] = resultado[coluna].astype('category')
+    resultado = indexar(resultado, 'yyyymm')
+    
+    return _marcar_origem(resultado, versao, 'cubo', empresa, periodo)
+
+def verificar_cubo():
+    """
+    Compara o cubo com as somas recalculadas a partir das transações.
+    
+    Returns:
+        dict: 'consistente' (bool), 'celulas' (int) e 'divergencias' (int)
+    """
+    esperado = _agregar_cubo(get_storage().carregar())
+    atual = carregar_cubo()
+    
+    def por_celula(cubo):
+        chaves = cubo[DIMENSOES_CUBO].astype(object).fillna('').astype(str)
+        return cubo['valor_centavos'].groupby([chaves[coluna] for coluna in DIMENSOES_CUBO]).sum()
+    
+    comparacao = pd.concat(
+        [por_celula(esperado).rename('esperado'), por_celula(atual).rename('atual')],
+        axis=1
+    ).fillna(0)
+    divergencias = int((comparacao['esperado'] != comparacao['atual']).sum())
+    
+    return {
+        'consistente': divergencias == 0,
+        'celulas': len(comparacao),
+        'divergencias': divergencias
+    }
+
+def _lotes_exportacao(empresa=None, desde_id=None, desde_data=None, tamanho_lote=50_000, incremental=False):
+    """
+    Percorre as transações a exportar em lotes de linhas.
+    
+    Args:
+        empresa: Nome da empresa para filtrar (opcional)
+        desde_id: Exporta apenas IDs maiores que este (opcional)
+        desde_data: Exporta apenas transações a partir desta data (opcional)
+        tamanho_lote: Número de linhas por lote
+        incremental: Se True, omite os IDs já registrados por
+            salvar_marcador_exportacao
+        
+    Yields:
+        DataFrame: Lote de transações com as colunas de COLUNAS
+    """
+    df = get_transactions(empresa)
+    
+    if desde_id is not None:
+        df = df[df['id'] > desde_id]
+    
+    if desde_data is not None:
+        df = df[df['data'] >= pd.Timestamp(desde_data)]
+    
+    # Pelo conjunto de IDs exportados, e não pelo maior ID ou pela data: IDs
+    # importados não seguem a ordem de gravação, e lançamentos podem ser retroativos
+    if incremental:
+        exportados = _IndiceIds(_ler_ids_exportados())
+        df = df[~exportados.contem(df['id'].to_numpy())]
+    
+    for inicio in range(0, len(df), tamanho_lote):
+        yield df.iloc[inicio:inicio + tamanho_lote][COLUNAS]
+
+def _blocos_csv(lotes, compactar=False):
+    """
+    Converte lotes de transações em blocos de bytes do CSV (opcionalmente gzip).
+    
+    Args:
+        lotes: Iterável de DataFrames com as colunas de COLUNAS
+        compactar: Se True, gera o conteúdo no formato gzip
+        
+    Yields:
+        bytes: Blocos consecutivos do arquivo
+    """
+    compressor = zlib.compressobj(wbits=31) if compactar else None
+    cabecalho = True
+    
+    def saida(bloco):
+        return compressor.compress(bloco) if compressor else bloco
+    
+    for lote in lotes:
+        bloco = lote.to_csv(index=False, header=cabecalho, date_format='%Y-%m-%d').encode('utf-8')
+        cabecalho = False
+        
+        dados = saida(bloco)
+        if dados:
+            yield dados
+    
+    # Exportação vazia: gera ao menos o cabeçalho
+    if cabecalho:
+        yield saida((",".join(COLUNAS) + "\n").encode('utf-8'))
+    
+    if compressor:
+        yield compressor.flush()
+
+def iterar_exportacao(empresa=None, desde_id=None, desde_data=None, compactar=False, tamanho_lote=50_000,
+                      incremental=False):
+    """
+    Gera o CSV de exportação em blocos de bytes, sob demanda.
+    
+    Apenas um lote é convertido para texto por vez, então a memória usada não
+    depende do tamanho da exportação.
+    
+    Args:
+        empresa: Nome da empresa para filtrar (opcional)
+        desde_id: Exporta apenas IDs maiores que este (opcional)
+        desde_data: Exporta apenas transações a partir desta data (opcional;
+            filtra pela data do lançamento, então lançamentos retroativos
+            gravados depois de uma exportação ficam de fora)
+        compactar: Se True, gera o conteúdo no formato gzip
+        tamanho_lote: Número de linhas convertidas por vez
+        incremental: Se True, exporta só os IDs ainda não registrados por
+            salvar_marcador_exportacao
+        
+    Returns:
+        generator: Blocos consecutivos do arquivo (bytes)
+    """
+    return _blocos_csv(_lotes_exportacao(empresa, desde_id, desde_data, tamanho_lote, incremental), compactar)
+
+def exportar_transacoes(arquivo, empresa=None, desde_id=None, desde_data=None, compactar=False,
+                        tamanho_lote=50_000, incremental=False, arquivo_ids=None):
+    """
+    Grava a exportação em um arquivo, bloco a bloco.
+    
+    Args:
+        arquivo: Caminho ou arquivo binário aberto para escrita
+        empresa: Nome da empresa para filtrar (opcional)
+        desde_id: Exporta apenas IDs maiores que este (opcional)
+        desde_data: Exporta apenas transações a partir desta data (opcional;
+            veja iterar_exportacao)
+        compactar: Se True, grava no formato gzip
+        tamanho_lote: Número de linhas convertidas por vez
+        incremental: Se True, exporta só os IDs ainda não registrados por
+            salvar_marcador_exportacao
+        arquivo_ids: Caminho onde gravar os IDs exportados (int64), a ser
+            passado a salvar_marcador_exportacao quando a exportação for
+            entregue (opcional)
+        
+    Returns:
+        dict: Número de linhas exportadas ('linhas')
+    """
+    resumo = {'linhas': 0}
+    
+    def lotes_contados(ids):
+        for lote in _lotes_exportacao(empresa, desde_id, desde_data, tamanho_lote, incremental):
+            resumo['linhas'] += len(lote)
+            if ids is not None:
+                ids.write(lote['id'].to_numpy(dtype='<i8').tobytes())
+            yield lote
+    
+    with (open(arquivo_ids, 'wb') if arquivo_ids else nullcontext()) as ids, \
+         (open(arquivo, 'wb') if isinstance(arquivo, str) else nullcontext(arquivo)) as destino:
+        for bloco in _blocos_csv(lotes_contados(ids), compactar):
+            destino.write(bloco)
+    
+    return resumo
+
+def _ler_ids_exportados():
+    """Lê os IDs registrados pelas exportações anteriores (int64 ordenados)."""
+    if not os.path.exists(EXPORT_IDS_PATH):
+        return np.empty(0, dtype='int64')
+    
+    return np.fromfile(EXPORT_IDS_PATH, dtype='<i8')
+
+def ler_marcador_exportacao():
+    """
+    Lê o marcador da última exportação incremental.
+    
+    Returns:
+        dict: {'data': str, 'exportados': int} ou None se nunca houve exportação
+    """
+    if not os.path.exists(EXPORT_MARKER_PATH):
+        return None
+    
+    with open(EXPORT_MARKER_PATH, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+def salvar_marcador_exportacao(arquivo_ids):
+    """
+    Registra os IDs de uma exportação, que o modo incremental passa a omitir.
+    
+    Args:
+        arquivo_ids: Arquivo de IDs gravado por exportar_transacoes
+    """
+    os.makedirs(os.path.dirname(EXPORT_MARKER_PATH) or ".", exist_ok=True)
+    
+    with _trava_arquivo(EXPORT_IDS_PATH + ".lock"):
+        ids = np.union1d(_ler_ids_exportados(), np.fromfile(arquivo_ids, dtype='<i8'))
+        
+        tmp_path = EXPORT_IDS_PATH + ".tmp"
+        ids.astype('<i8').tofile(tmp_path)
+        os.replace(tmp_path, EXPORT_IDS_PATH)
+        
+        marcador = {'data': datetime.now().isoformat(timespec='seconds'), 'exportados': len(ids)}
+        tmp_path = EXPORT_MARKER_PATH + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as arquivo:
+            json.dump(marcador, arquivo)
+        os.replace(tmp_path, EXPORT_MARKER_PATH)
+
+class _IndiceIds:
+    """
+    Índice de IDs gravados, mantido em blocos ordenados de int64.
+    
+    As consultas são feitas por busca binária em cada bloco, e os blocos são
+    fundidos quando passam de um limite, então o índice ocupa 8 bytes por ID.
+    """
+    
+    MAX_BLOCOS = 8
+    
+    def __init__(self, ids):
+        self._blocos = [np.sort(np.asarray(ids, dtype='int64'))]
+    
+    def contem(self, ids):
+        """Retorna uma máscara indicando quais IDs já estão no índice."""
+        ids = np.asarray(ids, dtype='int64')
+        encontrado = np.zeros(len(ids), dtype=bool)
+        
+        for bloco in self._blocos:
+            if len(bloco) == 0:
+                continue
+            posicao = np.minimum(np.searchsorted(bloco, ids), len(bloco) - 1)
+            encontrado |= bloco[posicao] == ids
+        
+        return encontrado
+    
+    def adicionar(self, ids):
+        """Inclui novos IDs no índice."""
+        self._blocos.append(np.sort(np.asarray(ids, dtype='int64')))
+        
+        if len(self._blocos) > self.MAX_BLOCOS:
+            self._blocos = [np.sort(np.concatenate(self._blocos))]
+
+def _fracao_lida(arquivo, tamanho):
+    """Retorna a fração já lida do arquivo, ou None se não for possível medir."""
+    try:
+        return min(arquivo.tell() / tamanho, 1.0) if tamanho else None
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def _gravar_quarentena(caminho, rejeitados):
+    """Acrescenta as linhas rejeitadas ao arquivo de quarentena."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    rejeitados.to_csv(caminho, mode='a', header=not os.path.exists(caminho), index=False)
+
+def import_csv(uploaded_file, tamanho_lote=50_000, progresso=None, quarentena=QUARENTENA_PATH):
+    """
+    Importa dados de um arquivo CSV enviado pelo usuário.
+    
+    O arquivo é lido em lotes: cada lote é validado, tem as duplicatas de ID
+    removidas (contra o índice de IDs gravados) e é anexado ao armazenamento,
+    então o uso de memória não depende do tamanho do arquivo.
+    
+    Linhas inválidas (veja utils.validators.validar_lancamentos) não são
+    gravadas; elas vão para o arquivo de quarentena com a coluna 'erros'.
+    
+    Args:
+        uploaded_file: Caminho ou arquivo aberto com o CSV
+        tamanho_lote: Número de linhas lidas por vez
+        progresso: Função opcional chamada após cada lote com
+            (linhas_processadas, fracao_lida), onde fracao_lida pode ser None
+        quarentena: CSV que recebe as linhas rejeitadas (substituído a cada
+            importação; None para apenas descartá-las)
+        
+    Returns:
+        tuple: (sucesso, mensagem)
+    """
+    required_columns = ['empresa', 'data', 'tipo', 'descricao', 'valor']
+    processados = importados = duplicados = invalidos = 0
     
-    return df
-def get_csv_download_link(df, filename="dados_financeiros.csv", text="Baixar CSV"):
-    """Gera um link para download do DataFrame como CSV"""
-    csv = df.to_csv(index=False)
-    b64 = base64.b64encode(csv.encode()).decode()
-    href = f'<a href="data:file/csv;base64,{b64}" download="{filename}">{text}</a>'
-    return href
-
-def import_csv(uploaded_file):
-    """Importa dados de um arquivo CSV enviado pelo usuário"""
     try:
-        # Lê o arquivo enviado
-        df_imported = pd.read_csv(uploaded_file)
+        # Tamanho do arquivo, para o cálculo do progresso
+        tamanho = getattr(uploaded_file, 'size', None)
+        if tamanho is None and isinstance(uploaded_file, str):
+            tamanho = os.path.getsize(uploaded_file)
+        elif tamanho is None and hasattr(uploaded_file, 'seek'):
+            posicao = uploaded_file.tell()
+            tamanho = uploaded_file.seek(0, os.SEEK_END)
+            uploaded_file.seek(posicao)
         
-        # Verifica se o arquivo tem as colunas necessárias
-        required_columns = ['empresa', 'data', 'tipo', 'descricao', 'valor']
-        missing_columns = [col for col in required_columns if col not in df_imported.columns]
+        storage = get_storage()
+        storage.inicializar()
+        indice = None
         
-        if missing_columns:
-            return False, f"Arquivo inválido. Colunas ausentes: {', '.join(missing_columns)}"
+        if quarentena and os.path.exists(quarentena):
+            os.remove(quarentena)
         
-        # Se não tiver coluna 'id', adiciona IDs baseados no timestamp
-        if 'id' not in df_imported.columns:
-            base_timestamp = int(datetime.now().timestamp())
-            df_imported['id'] = [base_timestamp + i for i in range(len(df_imported))]
+        # A compactação do CSV fica para o fim da importação, e não a cada lote
+        with storage.adiar_compactacao():
+            for lote in pd.read_csv(uploaded_file, chunksize=tamanho_lote):
+                # Verifica se o arquivo tem as colunas necessárias
+                if indice is None:
+                    missing_columns = [col for col in required_columns if col not in lote.columns]
+                    if missing_columns:
+                        return False, f"Arquivo inválido. Colunas ausentes: {', '.join(missing_columns)}"
+                    
+                    # Índice dos IDs já gravados, montado uma única vez
+                    indice = _IndiceIds(storage.listar_ids())
+                
+                processados += len(lote)
+                
+                # Separa as linhas com campos vazios, tipo inválido, valor não
+                # positivo ou data não reconhecida (validação do lote inteiro)
+                validas, erros = validar_lancamentos(lote)
+                if not validas.all():
+                    invalidos += int((~validas).sum())
+                    if quarentena:
+                        _gravar_quarentena(quarentena, lote[~validas].assign(erros=descrever_erros(erros[~validas])))
+                    lote = lote[validas]
+                
+                lote = lote.assign(valor=pd.to_numeric(lote['valor'], errors='coerce'))
+                
+                # Datas reconhecidas (ex.: DD/MM/AAAA) são gravadas como AAAA-MM-DD;
+                # o formato é detectado uma vez e só as datas distintas são convertidas
+                datas = interpretar_datas(lote['data'])
+                lote = lote.assign(data=lote['data'].where(datas.isna(), datas.dt.strftime('%Y-%m-%d')))
+                
+                # Linhas sem 'id' recebem IDs baseados no timestamp
+                lote = _completar_ids(lote)
+                
+                # Adiciona apenas os novos (evitando duplicatas de ID)
+                tamanho_antes = len(lote)
+                lote = lote.drop_duplicates(subset='id')
+                lote = lote[~indice.contem(lote['id'].to_numpy())]
+                duplicados += tamanho_antes - len(lote)
+                
+                if not lote.empty:
+                    _gravar(storage, lote)
+                    indice.adicionar(lote['id'].to_numpy())
+                    importados += len(lote)
+                
+                if progresso is not None:
+                    progresso(processados, _fracao_lida(uploaded_file, tamanho))
         
-        # Carrega os dados existentes
-        if os.path.exists(DATA_PATH):
-            df_existing = pd.read_csv(DATA_PATH)
-            
-            # Opção 1: Substituir todos os dados
-            # df_existing = df_imported
-            
-            # Opção 2: Adicionar apenas os novos (evitando duplicatas de ID)
-            existing_ids = set(df_existing['id'].values)
-            new_records = df_imported[~df_imported['id'].isin(existing_ids)]
-            df_combined = pd.concat([df_existing, new_records], ignore_index=True)
-            
-            # Salva o DataFrame combinado
-            df_combined.to_csv(DATA_PATH, index=False)
-        else:
-            # Se não existir arquivo, salva o importado diretamente
-            os.makedirs(os.path.dirname(DATA_PATH), exist_ok=True)
-            df_imported.to_csv(DATA_PATH, index=False)
+        if indice is None:
+            return False, "Arquivo inválido. Nenhum dado encontrado."
+        
+        mensagem = (
+            f"Importação concluída com sucesso! {processados} registros processados: "
+            f"{importados} importados, {duplicados} duplicados e {invalidos} inválidos ignorados."
+        )
+        if invalidos and quarentena:
+            mensagem += f" As linhas inválidas foram salvas em {quarentena}."
         
-        return True, f"Importação concluída com sucesso! {len(df_imported)} registros processados."
+        return True, mensagem
     
     except Exception as e:
         return False, f"Erro ao importar dados: {str(e)}"
+    
+    finally:
+        # Invalida o cache mesmo se a importação parar no meio
+        if importados:
+            _registrar_escrita()
 
-# Adicione esta seção à sua interface, por exemplo na página de lançamentos
-def adicionar_secao_importacao_exportacao():
-    st.subheader("Importar/Exportar Dados")
+if __name__ == "__main__":
+    import argparse
     
-    col1, col2 = st.columns(2)
+    parser = argparse.ArgumentParser(description="Manutenção dos dados financeiros")
+    comandos = parser.add_subparsers(dest="comando", required=True)
     
-    with col1:
-        st.markdown("### Exportar Dados")
-        df = get_transactions()  # Obtém todos os dados atuais
-        if not df.empty:
-            st.markdown(get_csv_download_link(df), unsafe_allow_html=True)
-        else:
-            st.info("Não há dados para exportar.")
-    
-    with col2:
-        st.markdown("### Importar Dados")
-        uploaded_file = st.file_uploader("Escolha um arquivo CSV", type="csv")
-        
-        if uploaded_file is not None:
-            if st.button("Processar Importação"):
-                success, message = import_csv(uploaded_file)
-                if success:
-                    st.success(message)
-                    # Opcional: recarregar a página para mostrar os novos dados
-                    st.experimental_rerun()
-                else:
-                    st.error(message)
+    cmd_migrar = comandos.add_parser("migrar", help="Copia data/user_data.csv para outro backend")
+    cmd_migrar.add_argument("--origem", default=DATA_PATH)
+    cmd_migrar.add_argument("--backend", default=SQLiteStorage.nome,
+                            choices=[SQLiteStorage.nome, PartitionedStorage.nome])
+    
+    comandos.add_parser("compactar", help="Incorpora o segmento append-only ao arquivo principal")
+    
+    comandos.add_parser("reconstruir-cubo", help="Recalcula o cubo mensal a partir das transações")
+    comandos.add_parser("verificar-cubo", help="Confere o cubo mensal contra as transações")
+    
+    args = parser.parse_args()
+    
+    if args.comando == "migrar":
+        total = migrar_csv(args.backend, args.origem)
+        print(f"{total} registros migrados para o backend {args.backend}")
+    elif args.comando == "compactar":
+        print(f"{compactar_dados()} registros compactados")
+    elif args.comando == "reconstruir-cubo":
+        print(f"Cubo reconstruído com {reconstruir_cubo()} células")
+    elif args.comando == "verificar-cubo":
+        resultado = verificar_cubo()
+        print(f"{resultado['divergencias']} divergências em {resultado['celulas']} células")
+        if not resultado['consistente']:
+            raise SystemExit(1)
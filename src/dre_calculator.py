@@ -1,101 +1,792 @@
 import pandas as pd
+import numpy as np
+import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from types import MappingProxyType
 
-def calcular_dre(df, empresa=None, periodo=None):
+from src.data_manager import TAMANHO_LOTE_LEITURA, iterar_transacoes, origem_dados, registrar_invalidacao, tipar_transacoes
+from src.filtros import filtrar, normalizar_periodo
+
+# Tipos de lançamento e linhas do DRE
+TIPOS = ['Receita', 'Custo', 'Despesa']
+COLUNAS_DRE = ['Receita', 'Custo', 'Despesa', 'Lucro Bruto', 'Lucro Líquido']
+
+# Tamanhos de período aceitos e janelas acumuladas (acumulado no ano e
+# últimos 12 meses)
+GRANULARIDADES = ['diaria', 'semanal', 'mensal', 'trimestral', 'anual']
+JANELAS = ['ytd', 'ttm']
+
+# Número máximo de resultados mantidos no cache do DRE
+CACHE_DRE_MAX_ENTRADAS = 64
+
+# Cache do DRE: chave da consulta -> resultado somente leitura
+_cache_dre = OrderedDict()
+_cache_dre_lock = threading.Lock()
+_estatisticas_dre = {'acertos': 0, 'falhas': 0}
+
+# Modo paralelo: abaixo deste número de empresas o cálculo é feito em série, e
+# cada processo recebe em média este número de lotes (equilibra a carga)
+MIN_EMPRESAS_PARALELO = 4
+LOTES_POR_PROCESSO = 4
+
+def _dre_vazio():
+    """Retorna um DRE com valores zerados."""
+    return {
+        'mensal': pd.DataFrame(columns=COLUNAS_DRE),
+        'totais': {coluna: 0 for coluna in COLUNAS_DRE}
+    }
+
+def _inicio_do_periodo(dias, granularidade):
+    """
+    Retorna o primeiro dia do período (da granularidade) que contém cada data.
+    
+    Args:
+        dias: Array datetime64[D]
+        granularidade: Uma das GRANULARIDADES
+    
+    Returns:
+        numpy.ndarray: Datas de início (datetime64[D])
+    """
+    if granularidade == 'diaria':
+        return dias
+    
+    if granularidade == 'semanal':
+        # Semanas começam na segunda-feira (1970-01-01 foi uma quinta-feira)
+        numeros = dias.view('int64')
+        return (numeros - (numeros + 3) % 7).view('datetime64[D]')
+    
+    return _inicio_dos_meses(dias.astype('datetime64[M]'), granularidade)
+
+def _inicio_dos_meses(meses, granularidade):
+    """Agrupa meses (datetime64[M]) em meses, trimestres ou anos."""
+    numeros = meses.view('int64')
+    if granularidade == 'trimestral':
+        numeros = numeros - numeros % 3
+    elif granularidade == 'anual':
+        numeros = numeros - numeros % 12
+    
+    return numeros.view('datetime64[M]').astype('datetime64[D]')
+
+def _fim_do_periodo(inicios, granularidade):
+    """Retorna o dia seguinte ao último dia de cada período (datetime64[D])."""
+    if granularidade == 'diaria':
+        return inicios + 1
+    
+    if granularidade == 'semanal':
+        return inicios + 7
+    
+    meses = {'mensal': 1, 'trimestral': 3, 'anual': 12}[granularidade]
+    return (inicios.astype('datetime64[M]') + meses).astype('datetime64[D]')
+
+def _rotulos(inicios, granularidade):
+    """Converte os inícios dos períodos nos rótulos exibidos no DRE."""
+    if granularidade in ('diaria', 'semanal'):
+        return np.datetime_as_string(inicios, unit='D')
+    
+    if granularidade == 'mensal':
+        return np.datetime_as_string(inicios, unit='M')
+    
+    anos = np.datetime_as_string(inicios, unit='Y')
+    if granularidade == 'anual':
+        return anos
+    
+    trimestres = inicios.astype('datetime64[M]').view('int64') % 12 // 3 + 1
+    return np.char.add(np.char.add(anos, '-T'), trimestres.astype(str))
+
+def _chaves_dre(df, granularidade):
+    """
+    Calcula o início do período de cada lançamento e os valores a somar.
+    
+    Lançamentos com data inválida ficam de fora.
+    
+    Returns:
+        tuple: (df filtrado, inícios datetime64[D], valores, divisor dos valores)
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade!r}. Use uma de {GRANULARIDADES}.")
+    
+    tipado = 'yyyymm' in df.columns and 'valor_centavos' in df.columns
+    
+    if 'data' not in df.columns:
+        # Células do cubo mensal: só há a chave de mês
+        if granularidade in ('diaria', 'semanal'):
+            raise ValueError(f"A granularidade {granularidade!r} exige as transações (coluna 'data'), não o cubo mensal.")
+        
+        df = df[df['yyyymm'] > 0]
+        chaves = df['yyyymm'].to_numpy(dtype='int64')
+        meses = ((chaves // 100 - 1970) * 12 + chaves % 100 - 1).view('datetime64[M]')
+        inicios = _inicio_dos_meses(meses, granularidade)
+    else:
+        # Converte para datetime para agrupar pelo período
+        datas = df['data'] if tipado else pd.to_datetime(df['data'], errors='coerce')
+        validas = datas.notna().to_numpy()
+        if not validas.all():
+            df = df[validas]
+            datas = datas[validas]
+        inicios = _inicio_do_periodo(datas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]'), granularidade)
+    
+    # Na representação tipada, soma em centavos (exato) e divide no final
+    if tipado:
+        return df, inicios, df['valor_centavos'], 100
+    
+    return df, inicios, df['valor'], 1
+
+def _aplicar_janela(somas, granularidade, janela):
+    """
+    Substitui cada período pela soma da janela que termina nele.
+    
+    As janelas são calculadas com uma soma acumulada por empresa e uma busca
+    binária pelo primeiro período de cada janela, sem recalcular cada uma.
+    
+    Args:
+        somas: Somas por (empresa, início do período), em ordem
+        granularidade: Uma das GRANULARIDADES
+        janela: 'ytd' (acumulado no ano) ou 'ttm' (últimos 12 meses)
+    
+    Returns:
+        DataFrame: Mesmo formato de somas, com os valores acumulados
+    """
+    if janela not in JANELAS:
+        raise ValueError(f"Janela inválida: {janela!r}. Use uma de {JANELAS}.")
+    
+    inicios = somas.index.get_level_values('mes').to_numpy(dtype='datetime64[D]')
+    
+    if janela == 'ytd':
+        limites = inicios.astype('datetime64[Y]').astype('datetime64[D]')
+    else:
+        # Períodos que começam nos 12 meses anteriores ao fim do período atual
+        fins = _fim_do_periodo(inicios, granularidade)
+        limites = (pd.DatetimeIndex(fins) - pd.DateOffset(months=12)).to_numpy(dtype='datetime64[D]')
+    
+    # Chave composta (empresa, dia): a janela nunca atravessa empresas
+    empresas = pd.factorize(somas.index.get_level_values('empresa'))[0].astype('int64') << 32
+    posicoes = empresas + inicios.view('int64')
+    primeiros = np.searchsorted(posicoes, empresas + limites.view('int64'), side='left')
+    
+    valores = somas.to_numpy()
+    acumulado = np.concatenate([np.zeros((1, valores.shape[1]), dtype=valores.dtype), valores.cumsum(axis=0)])
+    janelas = acumulado[np.arange(1, len(valores) + 1)] - acumulado[primeiros]
+    
+    return pd.DataFrame(janelas, index=somas.index, columns=somas.columns)
+
+def _tabela_dre(df, por_empresa, granularidade='mensal', janela=None, desde=None, plano=None):
+    """
+    Agrega os lançamentos em uma única passada por (empresa, período, tipo).
+    
+    Com plano de contas, a passada é por (empresa, período, folha do plano) e
+    as contas de todos os níveis (inclusive os tipos) saem das folhas com uma
+    única aplicação da matriz de agregação do plano.
+    
+    Args:
+        df: DataFrame com os lançamentos já filtrados
+        por_empresa: Se False, todas as empresas são somadas juntas
+        granularidade: Uma das GRANULARIDADES
+        janela: 'ytd' ou 'ttm' para valores acumulados (opcional)
+        desde: Descarta os períodos anteriores ao que contém esta data; usado
+            quando df inclui o histórico necessário para as janelas (opcional)
+        plano: PlanoContas para detalhar as contas (opcional)
+    
+    Returns:
+        tuple: (tabela, contas, nos). A tabela tem uma linha por (empresa, período),
+        com as colunas de COLUNAS_DRE; o índice tem os níveis 'empresa' e 'mes'
+        (rótulos YYYY-MM no DRE mensal; veja _rotulos para as demais
+        granularidades). contas tem o mesmo índice e uma coluna por código de
+        conta, e nos lista as contas como (código, nome, nível); ambos são
+        None sem plano.
+    """
+    # Chave do período e valores a somar (sem alterar o DataFrame recebido, que
+    # pode ser compartilhado pelo cache do data_manager)
+    df, inicios, valores, divisor = _chaves_dre(df, granularidade)
+    
+    empresa = df['empresa'] if por_empresa else pd.Series('', index=df.index)
+    periodo = pd.Series(inicios, index=df.index)
+    
+    if plano is None:
+        consolidacao = None
+        chave = df['tipo']
+        colunas = TIPOS
+    else:
+        consolidacao = plano.consolidacao(df['tipo'], df['descricao'])
+        chave = consolidacao.folhas
+        colunas = range(consolidacao.total_folhas)
+    
+    # Um único groupby, pivotado para uma coluna por tipo (ou folha)
+    somas = (
+        valores.groupby([empresa.rename('empresa'), periodo.rename('mes'), chave.rename('tipo')], observed=True)
+        .sum()
+        .unstack('tipo', fill_value=0)
+        .reindex(columns=colunas, fill_value=0)
+        .sort_index()
+    )
+    somas.columns.name = None
+    
+    return _finalizar_dre(somas, divisor, granularidade, janela, desde, consolidacao)
+
+def _finalizar_dre(somas, divisor, granularidade, janela=None, desde=None, consolidacao=None):
+    """
+    Completa o DRE a partir das somas por (empresa, início do período).
+    
+    Aplica a janela, descarta os períodos anteriores a desde, consolida as
+    contas do plano, converte os valores e os rótulos e calcula os lucros.
+    
+    Args:
+        somas: Somas por (empresa, início do período), uma coluna por tipo (ou
+            por folha do plano), em ordem e ainda sem o divisor
+        divisor: Divisor dos valores (100 para somas em centavos)
+        granularidade, janela, desde: Como em _tabela_dre
+        consolidacao: Consolidacao do plano de contas, se as colunas forem folhas
+    
+    Returns:
+        tuple: (tabela, contas, nos), como em _tabela_dre
+    """
+    if janela and not somas.empty:
+        somas = _aplicar_janela(somas, granularidade, janela)
+    
+    if desde is not None and not somas.empty:
+        primeiro = _inicio_do_periodo(np.array([desde], dtype='datetime64[D]'), granularidade)[0]
+        somas = somas[somas.index.get_level_values('mes') >= primeiro]
+    
+    # Soma as folhas em todos os níveis do plano
+    contas = None
+    if consolidacao is not None:
+        contas = consolidacao.aplicar(somas) / divisor
+        tabela = contas[TIPOS].copy()
+    else:
+        tabela = somas / divisor
+    
+    # Converte os inícios dos períodos para os rótulos exibidos
+    if not tabela.empty:
+        chaves = tabela.index.levels[1].to_numpy(dtype='datetime64[D]')
+        tabela.index = tabela.index.set_levels(_rotulos(chaves, granularidade), level='mes', verify_integrity=False)
+        if contas is not None:
+            contas.index = tabela.index
+    
+    # Calcula lucro bruto e líquido para todas as empresas de uma vez
+    tabela['Lucro Bruto'] = tabela['Receita'] - tabela['Custo']
+    tabela['Lucro Líquido'] = tabela['Lucro Bruto'] - tabela['Despesa']
+    
+    return tabela, contas, consolidacao.nos if consolidacao is not None else None
+
+def _arvore_contas(contas, nos, janela=None):
+    """
+    Monta a árvore de contas de uma empresa para exibição.
+    
+    Args:
+        contas: Valores por (período, conta), como retornado por _tabela_dre
+            (sem o nível 'empresa')
+        nos: Contas em ordem de exibição, como (código, nome, nível)
+        janela: 'ytd' ou 'ttm' se os valores forem acumulados (opcional)
+    
+    Returns:
+        DataFrame: Uma linha por conta, em ordem de exibição (índice 'codigo'),
+        com 'conta' (nome), 'nivel' (0 para os tipos), uma coluna por período e
+        'Total' (com janela, o valor do último período)
+    """
+    valores = contas.T
+    valores.columns = list(contas.index)
+    
+    total = valores.iloc[:, -1] if janela else valores.sum(axis=1)
+    
+    arvore = pd.DataFrame({
+        'conta': [nome for _, nome, _ in nos],
+        'nivel': [nivel for _, _, nivel in nos]
+    }, index=pd.Index([codigo for codigo, _, _ in nos], name='codigo'))
+    
+    return pd.concat([arvore, valores, total.rename('Total')], axis=1)
+
+def _resultado(dre_mensal, janela=None, contas=None, nos=None):
+    """Monta o dicionário de resultado a partir do DRE mensal de uma empresa."""
+    # Calcula totais (com janela, os valores acumulados do último período)
+    if janela:
+        totais = {coluna: dre_mensal[coluna].iloc[-1] for coluna in COLUNAS_DRE}
+    else:
+        totais = {coluna: dre_mensal[coluna].sum() for coluna in COLUNAS_DRE}
+    
+    resultado = {
+        'mensal': dre_mensal,
+        'totais': totais
+    }
+    
+    # Árvore do plano de contas, quando pedida
+    if contas is not None:
+        resultado['contas'] = _arvore_contas(contas, nos, janela)
+    
+    return resultado
+
+def periodo_da_janela(periodo, janela=None):
+    """
+    Amplia o período com o histórico necessário para calcular a janela.
+    
+    Use o período retornado para carregar os dados (get_transactions/get_cubo)
+    e o período original em calcular_dre.
+    
+    Args:
+        periodo: Tuple (data_inicio, data_fim) ou None
+        janela: 'ytd', 'ttm' ou None
+    
+    Returns:
+        tuple: (inicio, fim) como strings YYYY-MM-DD, ou o período recebido
+        quando não houver janela ou período
+    """
+    normalizado = normalizar_periodo(periodo)
+    if not janela or not normalizado:
+        return periodo
+    
+    inicio = pd.Timestamp(normalizado[0])
+    if janela == 'ytd':
+        inicio = inicio.replace(month=1, day=1)
+    else:
+        inicio = (inicio - pd.DateOffset(months=12)).replace(day=1)
+    
+    return inicio.strftime('%Y-%m-%d'), normalizado[1]
+
+def limpar_cache_dre():
+    """Descarta os resultados do DRE em cache."""
+    with _cache_dre_lock:
+        _cache_dre.clear()
+
+# Qualquer escrita em src.data_manager invalida o cache do DRE
+registrar_invalidacao(limpar_cache_dre)
+
+def estatisticas_cache_dre():
+    """
+    Retorna os contadores do cache do DRE.
+    
+    Returns:
+        dict: 'acertos', 'falhas', 'entradas' e 'taxa_acerto' (0 a 1)
+    """
+    with _cache_dre_lock:
+        acertos = _estatisticas_dre['acertos']
+        falhas = _estatisticas_dre['falhas']
+        entradas = len(_cache_dre)
+    
+    consultas = acertos + falhas
+    return {
+        'acertos': acertos,
+        'falhas': falhas,
+        'entradas': entradas,
+        'taxa_acerto': acertos / consultas if consultas else 0.0
+    }
+
+def _congelar(tabela):
+    """Copia o DataFrame para colunas com arrays não graváveis."""
+    colunas = {}
+    for coluna in tabela.columns:
+        valores = np.array(tabela[coluna].to_numpy(), copy=True)
+        valores.flags.writeable = False
+        colunas[coluna] = valores
+    
+    return pd.DataFrame(colunas, index=tabela.index, columns=tabela.columns, copy=False)
+
+def _somente_leitura(resultado):
+    """
+    Congela um resultado do DRE para ser compartilhado pelo cache.
+    
+    As colunas do DRE mensal (e da árvore de contas) passam a usar arrays não
+    graváveis e os totais viram um mapeamento imutável.
+    """
+    congelado = {
+        'mensal': _congelar(resultado['mensal']),
+        'totais': MappingProxyType(dict(resultado['totais']))
+    }
+    if 'contas' in resultado:
+        congelado['contas'] = _congelar(resultado['contas'])
+
+    return congelado
+
+def _chave_cache(df, empresa, periodo, granularidade, janela, plano):
+    """
+    Monta a chave do cache do DRE, ou None se o resultado não puder ser reutilizado.
+    
+    Só os próprios DataFrames entregues pelo data_manager (get_transactions e
+    get_cubo) têm conteúdo identificável; a origem traz a versão dos dados e os
+    filtros aplicados na leitura. Cópias e DataFrames derivados (assign,
+    filtros etc.) não têm origem e não passam pelo cache.
+    """
+    origem = origem_dados(df)
+    if origem is None:
+        return None
+    
+    return (
+        origem, len(df), empresa or None, normalizar_periodo(periodo), granularidade, janela or None,
+        plano.chave if plano is not None else None
+    )
+
+def calcular_dre(df, empresa=None, periodo=None, granularidade='mensal', janela=None, plano=None):
     """
     Calcula o DRE com base nos lançamentos.
     
+    Com janela, cada linha traz a soma acumulada no ano ('ytd') ou dos últimos
+    12 meses ('ttm') até o fim daquele período, e os totais são os do último
+    período. As janelas usam o histórico anterior ao período que estiver em
+    df; carregue os dados com periodo_da_janela(periodo, janela).
+    
+    Resultados de DataFrames vindos do data_manager ficam em um cache LRU até a
+    próxima escrita; nesse caso o resultado é somente leitura (o DRE mensal
+    usa arrays não graváveis e os totais não aceitam atribuição). Para alterar
+    o DRE mensal, use uma cópia.
+    
     Args:
         df: DataFrame com os lançamentos
         empresa: Nome da empresa para filtrar (opcional)
         periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
-        
+        granularidade: 'diaria', 'semanal', 'mensal', 'trimestral' ou 'anual'.
+            As duas primeiras exigem transações (não aceitam o cubo mensal).
+        janela: 'ytd' ou 'ttm' (opcional)
+        plano: PlanoContas (src.plano_contas) para detalhar as contas (opcional)
+    
     Returns:
-        dict: Dicionário com os valores do DRE mensal e totais
+        dict: Dicionário com o DRE por período ('mensal', mantido pelo nome
+        original) e os totais. Com plano, inclui também 'contas': a árvore do
+        plano com uma linha por conta (veja _arvore_contas).
     """
+    chave = _chave_cache(df, empresa, periodo, granularidade, janela, plano)
+    if chave is None:
+        return _calcular_dre(df, empresa, periodo, granularidade, janela, plano)
+    
+    with _cache_dre_lock:
+        resultado = _cache_dre.get(chave)
+        if resultado is not None:
+            _cache_dre.move_to_end(chave)
+            _estatisticas_dre['acertos'] += 1
+        else:
+            _estatisticas_dre['falhas'] += 1
+    
+    if resultado is None:
+        resultado = _somente_leitura(_calcular_dre(df, empresa, periodo, granularidade, janela, plano))
+        
+        with _cache_dre_lock:
+            _cache_dre[chave] = resultado
+            _cache_dre.move_to_end(chave)
+            while len(_cache_dre) > CACHE_DRE_MAX_ENTRADAS:
+                _cache_dre.popitem(last=False)
+    
+    # Cópia rasa: o chamador pode acrescentar colunas sem afetar o cache
+    copia = dict(resultado)
+    for nome in ('mensal', 'contas'):
+        if nome in copia:
+            copia[nome] = copia[nome].copy(deep=False)
+    
+    return copia
+
+def _inicio_filtro(periodo, janela):
+    """Retorna o período a filtrar e a data a partir da qual o DRE é exibido."""
+    periodo = normalizar_periodo(periodo)
+    if janela and periodo:
+        return periodo_da_janela(periodo, janela), periodo[0]
+    
+    return periodo, None
+
+def _calcular_dre(df, empresa=None, periodo=None, granularidade='mensal', janela=None, plano=None):
+    """Calcula o DRE sem passar pelo cache (mesmos argumentos de calcular_dre)."""
     # Se o DataFrame estiver vazio, retorna valores zerados
     if df.empty:
-        return {
-            'mensal': pd.DataFrame(columns=['Receita', 'Custo', 'Despesa', 'Lucro Bruto', 'Lucro Líquido']),
-            'totais': {
-                'Receita': 0,
-                'Custo': 0,
-                'Despesa': 0,
-                'Lucro Bruto': 0,
-                'Lucro Líquido': 0
-            }
-        }
+        return _dre_vazio()
+    
+    # Filtra por empresa e período, se especificados
+    periodo, desde = _inicio_filtro(periodo, janela)
+    df = filtrar(df, empresa, periodo)
+    
+    # Se após os filtros o DataFrame estiver vazio, retorna valores zerados
+    if df.empty:
+        return _dre_vazio()
+    
+    tabela, contas, nos = _tabela_dre(df, False, granularidade, janela, desde, plano)
+    if tabela.empty:
+        return _dre_vazio()
+    
+    if contas is not None:
+        contas = contas.droplevel('empresa')
+
+    return _resultado(tabela.droplevel('empresa'), janela, contas, nos)
+
+def calcular_dre_multi(df, empresas=None, periodo=None, granularidade='mensal', janela=None, plano=None):
+    """
+    Calcula o DRE de várias empresas com uma única agregação.
+    
+    Args:
+        df: DataFrame com os lançamentos
+        empresas: Lista de empresas (opcional; padrão: todas as presentes em df)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        granularidade: Tamanho dos períodos (veja calcular_dre)
+        janela: 'ytd' ou 'ttm' (opcional)
+        plano: PlanoContas para detalhar as contas (opcional)
     
-    # Filtra por empresa se especificado
-    if empresa:
-        df = df[df['empresa'] == empresa]
+    Returns:
+        dict: Para cada empresa, o mesmo dicionário retornado por calcular_dre.
+        Empresas pedidas sem lançamentos no período recebem um DRE zerado.
+    """
+    if not df.empty and empresas is not None:
+        df = df[df['empresa'].isin(empresas)]
     
-    # Filtra por período se especificado
-    if periodo and len(periodo) == 2:
-        # Converte datas para string se forem objetos datetime
-        inicio = periodo[0]
-        fim = periodo[1]
+    periodo, desde = _inicio_filtro(periodo, janela)
+    df = filtrar(df, periodo=periodo)
+    
+    tabela, contas, nos = _tabela_dre(df, True, granularidade, janela, desde, plano) if not df.empty else (None, None, None)
+    
+    resultados = {}
+    if tabela is not None:
+        for nome, dre_mensal in tabela.groupby(level='empresa', sort=False, observed=True):
+            contas_empresa = contas.loc[nome] if contas is not None else None
+            resultados[nome] = _resultado(dre_mensal.droplevel('empresa'), janela, contas_empresa, nos)
+    
+    # Empresas sem lançamentos recebem valores zerados
+    if empresas is not None:
+        resultados = {nome: resultados.get(nome) or _dre_vazio() for nome in empresas}
+    
+    return resultados
+
+def _numero_processos(processos=None):
+    """Número de processos do modo paralelo (padrão: DRE_PROCESSOS ou o número de CPUs)."""
+    if processos is None:
+        processos = os.environ.get("DRE_PROCESSOS") or os.cpu_count() or 1
+    
+    return max(1, int(processos))
+
+def _somar_fatias(colunas, fatias):
+    """
+    Soma por (início do período, tipo) os lançamentos de cada empresa.
+    
+    Args:
+        colunas: Arrays alinhados 'inicios' (dias, int64), 'tipos' (posição em
+            TIPOS, -1 para outros) e 'valores'
+        fatias: Lista de (empresa, início, fim), as linhas de cada empresa
+    
+    Returns:
+        list: (empresa, inícios dos períodos, somas períodos x TIPOS) por empresa
+    """
+    resultados = []
+    for empresa, inicio, fim in fatias:
+        tipos = colunas['tipos'][inicio:fim]
+        valores = colunas['valores'][inicio:fim]
+        baldes, posicoes = np.unique(colunas['inicios'][inicio:fim], return_inverse=True)
+        
+        somas = np.zeros((len(baldes), len(TIPOS)), dtype=valores.dtype)
+        validos = tipos >= 0
+        np.add.at(somas, (posicoes[validos], tipos[validos]), valores[validos])
+        
+        resultados.append((empresa, baldes, somas))
+    
+    return resultados
+
+def _trabalhador_dre(memorias, fatias):
+    """
+    Soma as fatias de um lote dentro de um processo do pool.
+    
+    As colunas são lidas diretamente da memória compartilhada criada pelo
+    processo principal, sem serializar o DataFrame.
+    
+    Args:
+        memorias: Para cada coluna, (nome da SharedMemory, dtype, tamanho)
+        fatias: Lote de (empresa, início, fim)
+    """
+    abertas = []
+    try:
+        colunas = {}
+        for nome, (nome_memoria, tipo, tamanho) in memorias.items():
+            memoria = shared_memory.SharedMemory(name=nome_memoria)
+            abertas.append(memoria)
+            colunas[nome] = np.ndarray(tamanho, dtype=tipo, buffer=memoria.buf)
         
-        if hasattr(inicio, 'strftime'):
-            inicio = inicio.strftime('%Y-%m-%d')
+        return _somar_fatias(colunas, fatias)
+    finally:
+        # As visões precisam ser descartadas antes de fechar as memórias
+        colunas = None
+        for memoria in abertas:
+            memoria.close()
+
+def _distribuir(fatias, lotes):
+    """Divide as empresas em lotes com número de linhas parecido (maiores primeiro)."""
+    cargas = [(0, i) for i in range(min(lotes, len(fatias)))]
+    distribuicao = [[] for _ in cargas]
+    
+    for fatia in sorted(fatias, key=lambda fatia: fatia[2] - fatia[1], reverse=True):
+        carga, indice = heapq.heappop(cargas)
+        distribuicao[indice].append(fatia)
+        heapq.heappush(cargas, (carga + fatia[2] - fatia[1], indice))
+    
+    return distribuicao
+
+def _somar_em_paralelo(colunas, fatias, processos):
+    """
+    Executa _somar_fatias em um pool de processos, com fallback em série.
+    
+    Returns:
+        list: Mesmo formato de _somar_fatias
+    """
+    if processos == 1 or len(fatias) < MIN_EMPRESAS_PARALELO:
+        return _somar_fatias(colunas, fatias)
+    
+    memorias = []
+    try:
+        # Copia cada coluna uma única vez para a memória compartilhada
+        descricao = {}
+        for nome, valores in colunas.items():
+            memoria = shared_memory.SharedMemory(create=True, size=max(valores.nbytes, 1))
+            memorias.append(memoria)
+            np.ndarray(valores.shape, dtype=valores.dtype, buffer=memoria.buf)[:] = valores
+            descricao[nome] = (memoria.name, valores.dtype.str, len(valores))
         
-        if hasattr(fim, 'strftime'):
-            fim = fim.strftime('%Y-%m-%d')
+        lotes = _distribuir(fatias, processos * LOTES_POR_PROCESSO)
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            partes = list(executor.map(_trabalhador_dre, [descricao] * len(lotes), lotes))
         
-        df = df[(df['data'] >= inicio) & (df['data'] <= fim)]
+        return [item for parte in partes for item in parte]
     
-    # Se após os filtros o DataFrame estiver vazio, retorna valores zerados
-    if df.empty:
-        return {
-            'mensal': pd.DataFrame(columns=['Receita', 'Custo', 'Despesa', 'Lucro Bruto', 'Lucro Líquido']),
-            'totais': {
-                'Receita': 0,
-                'Custo': 0,
-                'Despesa': 0,
-                'Lucro Bruto': 0,
-                'Lucro Líquido': 0
-            }
+    except (OSError, NotImplementedError, BrokenProcessPool) as e:
+        # Ambiente sem suporte a processos ou memória compartilhada
+        print(f"Modo paralelo indisponível ({e}); calculando em série.")
+        return _somar_fatias(colunas, fatias)
+    
+    finally:
+        for memoria in memorias:
+            memoria.close()
+            memoria.unlink()
+
+def calcular_dre_paralelo(df, empresas=None, periodo=None, granularidade='mensal', janela=None, processos=None):
+    """
+    Calcula o DRE de cada empresa em um pool de processos e o consolidado.
+    
+    O livro é separado por empresa e as colunas necessárias (início do
+    período, tipo e valor) vão uma única vez para a memória compartilhada;
+    cada processo soma um lote de empresas. O consolidado é calculado a partir
+    das mesmas somas, sem nova passada pelos lançamentos. Com um processo, ou
+    com poucas empresas, tudo é feito em série.
+    
+    Args:
+        df: DataFrame com os lançamentos
+        empresas: Lista de empresas (opcional; padrão: todas as presentes em df)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        granularidade: Tamanho dos períodos (veja calcular_dre)
+        janela: 'ytd' ou 'ttm' (opcional)
+        processos: Número de processos (padrão: variável de ambiente
+            DRE_PROCESSOS ou o número de CPUs)
+    
+    Returns:
+        dict: 'empresas' (o mesmo dicionário de calcular_dre_multi) e
+        'consolidado' (DRE da soma das empresas)
+    """
+    if not df.empty and empresas is not None:
+        df = df[df['empresa'].isin(empresas)]
+    
+    periodo, desde = _inicio_filtro(periodo, janela)
+    df = filtrar(df, periodo=periodo)
+    
+    resultados = {}
+    consolidado = _dre_vazio()
+    
+    if not df.empty:
+        df, inicios, valores, divisor = _chaves_dre(df, granularidade)
+        
+    # _chaves_dre descarta as linhas com data inválida, e o df pode ficar vazio
+    if not df.empty:
+        # Linhas de cada empresa em blocos contínuos
+        codigos, nomes = pd.factorize(df['empresa'], sort=True)
+        ordem = np.argsort(codigos, kind='stable')
+        limites = np.searchsorted(codigos[ordem], np.arange(len(nomes) + 1))
+        fatias = [(nome, int(limites[i]), int(limites[i + 1])) for i, nome in enumerate(nomes)]
+        
+        colunas = {
+            'inicios': inicios.view('int64')[ordem],
+            'tipos': pd.Categorical(df['tipo'], categories=TIPOS).codes.astype('int8')[ordem],
+            'valores': valores.to_numpy()[ordem]
         }
+        partes = _somar_em_paralelo(colunas, fatias, _numero_processos(processos))
+        
+        # Reúne as somas de todas as empresas no formato de _tabela_dre
+        indice = pd.MultiIndex.from_arrays([
+            np.repeat(np.array([nome for nome, _, _ in partes], dtype=object), [len(baldes) for _, baldes, _ in partes]),
+            np.concatenate([baldes for _, baldes, _ in partes]).view('datetime64[D]')
+        ], names=['empresa', 'mes'])
+        somas = pd.DataFrame(np.concatenate([parte for _, _, parte in partes]), index=indice, columns=TIPOS).sort_index()
+        
+        tabela, _, _ = _finalizar_dre(somas, divisor, granularidade, janela, desde)
+        for nome, dre_mensal in tabela.groupby(level='empresa', sort=False):
+            resultados[nome] = _resultado(dre_mensal.droplevel('empresa'), janela)
+        
+        # Consolidado: soma das empresas por período
+        total = somas.groupby(level='mes').sum()
+        total.index = pd.MultiIndex.from_arrays([np.full(len(total), ''), total.index], names=['empresa', 'mes'])
+        tabela_total, _, _ = _finalizar_dre(total, divisor, granularidade, janela, desde)
+        if not tabela_total.empty:
+            consolidado = _resultado(tabela_total.droplevel('empresa'), janela)
     
-    # Converte para datetime para agrupar por mês
-    df['data'] = pd.to_datetime(df['data'])
-    df['mes'] = df['data'].dt.strftime('%Y-%m')
-    
-    # Agrupa por mês e tipo
-    receitas = df[df['tipo'] == 'Receita'].groupby('mes')['valor'].sum()
-    custos = df[df['tipo'] == 'Custo'].groupby('mes')['valor'].sum()
-    despesas = df[df['tipo'] == 'Despesa'].groupby('mes')['valor'].sum()
-    
-    # Cria DataFrame do DRE mensal
-    meses = sorted(list(set(receitas.index) | set(custos.index) | set(despesas.index)))
-    dre_mensal = pd.DataFrame(index=meses, columns=['Receita', 'Custo', 'Despesa', 'Lucro Bruto', 'Lucro Líquido'])
-    
-    # Preenche valores
-    dre_mensal['Receita'] = receitas
-    dre_mensal['Custo'] = custos
-    dre_mensal['Despesa'] = despesas
-    
-    # Preenche NaN com zeros
-    dre_mensal = dre_mensal.fillna(0)
-    
-    # Calcula lucro bruto e líquido
-    dre_mensal['Lucro Bruto'] = dre_mensal['Receita'] - dre_mensal['Custo']
-    dre_mensal['Lucro Líquido'] = dre_mensal['Lucro Bruto'] - dre_mensal['Despesa']
-    
-    # Calcula totais
-    totais = {
-        'Receita': dre_mensal['Receita'].sum(),
-        'Custo': dre_mensal['Custo'].sum(),
-        'Despesa': dre_mensal['Despesa'].sum(),
-        'Lucro Bruto': dre_mensal['Lucro Bruto'].sum(),
-        'Lucro Líquido': dre_mensal['Lucro Líquido'].sum()
-    }
+    # Empresas sem lançamentos recebem valores zerados
+    if empresas is not None:
+        resultados = {nome: resultados.get(nome) or _dre_vazio() for nome in empresas}
     
-    return {
-        'mensal': dre_mensal,
-        'totais': totais
-    }
+    return {'empresas': resultados, 'consolidado': consolidado}
+
+def _combinar_parciais(parciais):
+    """Junta somas parciais por (período, tipo) em uma única Series."""
+    if len(parciais) == 1:
+        return parciais[0]
     
-    return {
-        'mensal': dre,
-        'totais': totais
-    }
+    return pd.concat(parciais).groupby(level=['mes', 'tipo'], sort=False).sum()
+
+def calcular_dre_em_lotes(fonte=None, empresa=None, periodo=None, granularidade='mensal', janela=None, tamanho_lote=None):
+    """
+    Calcula o DRE lendo os lançamentos em lotes (livros maiores que a memória).
+    
+    Cada lote é convertido com tipar_transacoes e reduzido às somas em
+    centavos por (período, tipo); as somas parciais são combinadas à medida que
+    crescem. A memória fica limitada ao tamanho do lote mais o do resultado, e
+    o resultado é igual ao de calcular_dre sobre get_transactions.
+    
+    Args:
+        fonte: Backend ou caminho lido (veja data_manager.iterar_transacoes;
+            padrão: o backend em uso)
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        granularidade: Tamanho dos períodos (veja calcular_dre)
+        janela: 'ytd' ou 'ttm' (opcional)
+        tamanho_lote: Linhas lidas por vez (padrão: TAMANHO_LOTE_LEITURA)
+    
+    Returns:
+        dict: O mesmo dicionário de calcular_dre (sem plano de contas)
+    """
+    if granularidade not in GRANULARIDADES:
+        raise ValueError(f"Granularidade inválida: {granularidade!r}. Use uma de {GRANULARIDADES}.")
+    
+    periodo, desde = _inicio_filtro(periodo, janela)
+    
+    parciais = []
+    linhas = 0
+    for lote in iterar_transacoes(empresa, periodo, tamanho_lote, fonte):
+        lote = tipar_transacoes(lote)
+        
+        # Tipos fora de TIPOS seguem nas somas, como em calcular_dre: o
+        # período continua no resultado (zerado) e só a coluna é descartada
+        lote, inicios, valores, _ = _chaves_dre(lote, granularidade)
+        parcial = valores.groupby([pd.Series(inicios, index=lote.index, name='mes'), lote['tipo'].astype(str)], sort=False).sum()
+        parciais.append(parcial)
+        linhas += len(parcial)
+        
+        # Combina as parciais quando passam do tamanho de um lote
+        if linhas > (tamanho_lote or TAMANHO_LOTE_LEITURA):
+            parciais = [_combinar_parciais(parciais)]
+            linhas = len(parciais[0])
+    
+    if not parciais:
+        return _dre_vazio()
+    
+    # Mesmo formato de somas de _tabela_dre, com uma única "empresa"
+    somas = (
+        _combinar_parciais(parciais)
+        .unstack('tipo', fill_value=0)
+        .reindex(columns=TIPOS, fill_value=0)
+        .sort_index()
+    )
+    somas.columns.name = None
+    somas.index = pd.MultiIndex.from_arrays([np.full(len(somas), ''), somas.index], names=['empresa', 'mes'])
+    
+    tabela, _, _ = _finalizar_dre(somas, 100, granularidade, janela, desde)
+    if tabela.empty:
+        return _dre_vazio()
+    
+    return _resultado(tabela.droplevel('empresa'), janela)
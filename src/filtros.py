@@ -0,0 +1,210 @@
+import weakref
+import numpy as np
+import pandas as pd
+
+# Índices registrados: id do DataFrame -> (referência fraca ao DataFrame, índice)
+_indices = {}
+
+# Chave usada para datas inválidas, que ficam no fim de cada empresa
+_CHAVE_INVALIDA = np.iinfo('int64').max
+
+class IndiceEmpresaData:
+    """
+    Posições das linhas de um DataFrame ordenado por (empresa, data).
+    
+    Cada empresa ocupa um bloco contínuo de linhas e, dentro do bloco, as
+    chaves de data estão em ordem crescente, de modo que um período vira duas
+    buscas binárias.
+    """
+    
+    def __init__(self, coluna, chaves, blocos):
+        # 'data' (chaves em dias) ou 'yyyymm' (chaves em meses, no cubo)
+        self.coluna = coluna
+        self.chaves = chaves
+        # Lista de (empresa, início, fim) na ordem das linhas
+        self.blocos = blocos
+        self.posicoes = {empresa: (inicio, fim) for empresa, inicio, fim in blocos if not pd.isna(empresa)}
+    
+    def limites(self, periodo):
+        """Converte um período normalizado para o intervalo fechado de chaves."""
+        inicio, fim = periodo
+        if self.coluna == 'yyyymm':
+            return int(inicio[:7].replace('-', '')), int(fim[:7].replace('-', ''))
+        
+        return _dias(np.array([inicio, fim], dtype='datetime64[D]'))
+    
+    def fatias(self, empresa=None, periodo=None):
+        """
+        Calcula os intervalos de linhas que atendem aos filtros.
+        
+        Returns:
+            list: (empresa, início, fim) de cada bloco não vazio
+        """
+        if empresa:
+            blocos = [(empresa,) + self.posicoes[empresa]] if empresa in self.posicoes else []
+        else:
+            blocos = self.blocos
+        
+        if not periodo:
+            return [bloco for bloco in blocos if bloco[2] > bloco[1]]
+        
+        menor, maior = self.limites(periodo)
+        fatias = []
+        for nome, inicio, fim in blocos:
+            chaves = self.chaves[inicio:fim]
+            primeiro = inicio + int(np.searchsorted(chaves, menor, side='left'))
+            ultimo = inicio + int(np.searchsorted(chaves, maior, side='right'))
+            if ultimo > primeiro:
+                fatias.append((nome, primeiro, ultimo))
+        
+        return fatias
+
+def _dias(datas):
+    """Converte datas em número de dias (int64); datas inválidas vão para o fim."""
+    datas = np.asarray(datas).astype('datetime64[D]')
+    return np.where(np.isnat(datas), _CHAVE_INVALIDA, datas.view('int64'))
+
+def _registrar(df, indice):
+    """Associa o índice ao DataFrame enquanto ele existir."""
+    chave = id(df)
+    referencia = weakref.ref(df, lambda _, chave=chave: _indices.pop(chave, None))
+    _indices[chave] = (referencia, indice)
+    
+    return df
+
+def _indice(df):
+    """Retorna o índice registrado para este DataFrame, se houver."""
+    item = _indices.get(id(df))
+    if item is not None and item[0]() is df and len(item[1].chaves) == len(df):
+        return item[1]
+    
+    return None
+
+def normalizar_periodo(periodo):
+    """
+    Converte o período para um par de strings YYYY-MM-DD.
+    
+    Args:
+        periodo: Tuple (data_inicio, data_fim) ou None
+    
+    Returns:
+        tuple: (inicio, fim) como strings, ou None se não houver período
+    """
+    if not periodo or len(periodo) != 2:
+        return None
+    
+    # Converte datas para string se forem objetos datetime
+    inicio = periodo[0]
+    fim = periodo[1]
+    
+    if hasattr(inicio, 'strftime'):
+        inicio = inicio.strftime('%Y-%m-%d')
+    
+    if hasattr(fim, 'strftime'):
+        fim = fim.strftime('%Y-%m-%d')
+    
+    return inicio, fim
+
+def indexar(df, coluna='data'):
+    """
+    Ordena o DataFrame por (empresa, coluna) e registra o índice por empresa.
+    
+    O índice permite que filtrar() resolva empresa e período com buscas
+    binárias e fatias, sem comparar todas as linhas.
+    
+    Args:
+        df: Transações tipadas (coluna 'data' datetime64) ou células do cubo
+            (coluna 'yyyymm')
+        coluna: 'data' ou 'yyyymm'
+    
+    Returns:
+        DataFrame: O DataFrame ordenado (o próprio df, se já estava em ordem)
+    """
+    if coluna == 'yyyymm':
+        chaves = df['yyyymm'].to_numpy(dtype='int64')
+    else:
+        chaves = _dias(df['data'].to_numpy(dtype='datetime64[ns]'))
+    
+    empresas = df['empresa']
+    if isinstance(empresas.dtype, pd.CategoricalDtype):
+        codigos = empresas.cat.codes.to_numpy()
+    else:
+        codigos = pd.factorize(empresas)[0]
+    
+    # Ordenação estável: mantém a ordem de gravação dentro de cada data
+    ordem = np.lexsort((chaves, codigos))
+    if not np.array_equal(ordem, np.arange(len(df))):
+        df = df.iloc[ordem]
+        chaves = chaves[ordem]
+        codigos = codigos[ordem]
+    
+    # Fronteiras entre as empresas
+    inicios = np.concatenate([[0], np.flatnonzero(np.diff(codigos)) + 1]) if len(df) else np.array([], dtype='int64')
+    fins = np.append(inicios[1:], len(df))
+    nomes = empresas.iloc[ordem[inicios]] if len(df) else []
+    blocos = [(nome, int(inicio), int(fim)) for nome, inicio, fim in zip(nomes, inicios, fins)]
+    
+    return _registrar(df, IndiceEmpresaData(coluna, chaves, blocos))
+
+def _filtrar_mascara(df, empresa, periodo):
+    """Filtra com máscaras booleanas (DataFrames sem índice registrado)."""
+    if empresa:
+        df = df[df['empresa'] == empresa]
+    
+    if periodo:
+        inicio, fim = periodo
+        
+        if 'data' in df.columns:
+            df = df[(df['data'] >= inicio) & (df['data'] <= fim)]
+        else:
+            # Células do cubo mensal: filtra pelos meses do período
+            df = df[(df['yyyymm'] >= int(inicio[:7].replace('-', ''))) & (df['yyyymm'] <= int(fim[:7].replace('-', '')))]
+    
+    return df
+
+def filtrar(df, empresa=None, periodo=None):
+    """
+    Filtra transações ou células do cubo por empresa e período.
+    
+    Em DataFrames registrados por indexar() o filtro usa buscas binárias e
+    devolve uma fatia (sem cópia quando o resultado é um bloco contínuo), que
+    também fica indexada. Nos demais, aplica máscaras booleanas.
+    
+    Args:
+        df: DataFrame com as colunas 'empresa' e 'data' (ou 'yyyymm')
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+    
+    Returns:
+        DataFrame: Linhas filtradas (não deve ser modificado)
+    """
+    periodo = normalizar_periodo(periodo)
+    if df.empty or (not empresa and not periodo):
+        return df
+    
+    indice = _indice(df)
+    if indice is None:
+        return _filtrar_mascara(df, empresa, periodo)
+    
+    fatias = indice.fatias(empresa, periodo)
+    
+    if len(fatias) == 1:
+        nome, inicio, fim = fatias[0]
+        resultado = df.iloc[inicio:fim]
+        chaves = indice.chaves[inicio:fim]
+    elif fatias:
+        posicoes = np.concatenate([np.arange(inicio, fim) for _, inicio, fim in fatias])
+        resultado = df.iloc[posicoes]
+        chaves = indice.chaves[posicoes]
+    else:
+        resultado = df.iloc[:0]
+        chaves = indice.chaves[:0]
+    
+    # Posições das empresas dentro do resultado
+    blocos = []
+    deslocamento = 0
+    for nome, inicio, fim in fatias:
+        blocos.append((nome, deslocamento, deslocamento + fim - inicio))
+        deslocamento += fim - inicio
+    
+    return _registrar(resultado, IndiceEmpresaData(indice.coluna, chaves, blocos))
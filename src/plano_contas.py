@@ -0,0 +1,185 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+from src.dre_calculator import TIPOS
+
+# Arquivo opcional com o plano de contas configurado pelo usuário
+PLANO_CONTAS_PATH = "data/plano_contas.json"
+
+# Plano padrão: para cada tipo, grupos (dicionários) e descrições (listas)
+PLANO_CONTAS_PADRAO = {
+    'Receita': {
+        'Receita Operacional': ['Vendas', 'Serviços', 'Assinaturas'],
+        'Outras Receitas': ['Outros']
+    },
+    'Custo': {
+        'Custos de Produção': ['Matéria-prima', 'Produção'],
+        'Custos de Distribuição': ['Logística'],
+        'Outros Custos': ['Outros']
+    },
+    'Despesa': {
+        'Pessoal': ['Salários'],
+        'Ocupação': ['Aluguel', 'Utilities'],
+        'Comercial': ['Marketing'],
+        'Outras Despesas': ['Outros']
+    }
+}
+
+# Separador dos códigos das contas (caminho desde o tipo)
+SEPARADOR = "/"
+
+# Grupo que recebe, em cada tipo, as descrições ausentes do plano
+NAO_CLASSIFICADO = "Não classificado"
+
+class Consolidacao:
+    """
+    Contas de um conjunto de lançamentos e a agregação das folhas para os nós.
+    
+    Cada par (tipo, descrição) presente nos lançamentos é uma coluna de folha.
+    A agregação é uma matriz esparsa nó x folha guardada como pares
+    (ancestral, folha), incluindo a própria folha, aplicada em uma passada.
+    """
+    
+    def __init__(self, nos, folhas, total_folhas, ancestrais, colunas):
+        # Lista de (código, nome, nível) na ordem de exibição
+        self.nos = nos
+        # Coluna de folha de cada lançamento (Series de inteiros)
+        self.folhas = folhas
+        self.total_folhas = total_folhas
+        # Pares não nulos da matriz de agregação
+        self.ancestrais = ancestrais
+        self.colunas = colunas
+    
+    @property
+    def codigos(self):
+        return [codigo for codigo, _, _ in self.nos]
+    
+    def aplicar(self, somas):
+        """
+        Soma as folhas em todos os níveis do plano.
+        
+        Args:
+            somas: DataFrame com uma coluna por folha (0 .. total_folhas - 1)
+        
+        Returns:
+            DataFrame: Mesmo índice, uma coluna por conta (código)
+        """
+        folhas = somas.to_numpy()
+        contas = np.zeros((len(somas), len(self.nos)), dtype=folhas.dtype)
+        np.add.at(contas, (slice(None), self.ancestrais), folhas[:, self.colunas])
+        
+        return pd.DataFrame(contas, index=somas.index, columns=self.codigos)
+
+class PlanoContas:
+    """
+    Plano de contas hierárquico: tipo -> grupos -> descrições.
+    
+    Os tipos de lançamento (TIPOS) são as contas de primeiro nível.
+    
+    As descrições sem conta no plano entram no grupo NAO_CLASSIFICADO do seu
+    tipo, de modo que os totais de cada tipo não mudam.
+    """
+    
+    def __init__(self, estrutura=None):
+        self.estrutura = estrutura if estrutura is not None else PLANO_CONTAS_PADRAO
+        # Identifica o conteúdo do plano (usada no cache do DRE)
+        self.chave = json.dumps(self.estrutura, sort_keys=True, ensure_ascii=False)
+        
+        # Nós de cada tipo em ordem de exibição: (código, nome, nível, pai)
+        self.nos_por_tipo = {}
+        # (tipo, descrição) -> código da folha
+        self.folhas = {}
+        for tipo in TIPOS:
+            nos = [(tipo, tipo, 0, None)]
+            self._adicionar(nos, tipo, self.estrutura.get(tipo, {}), tipo, 1)
+            self.nos_por_tipo[tipo] = nos
+    
+    def _adicionar(self, nos, tipo, filhos, pai, nivel):
+        """Percorre a estrutura configurada acrescentando os nós em pré-ordem."""
+        if isinstance(filhos, dict):
+            for nome, netos in filhos.items():
+                codigo = pai + SEPARADOR + nome
+                nos.append((codigo, nome, nivel, pai))
+                self._adicionar(nos, tipo, netos, codigo, nivel + 1)
+            return
+        
+        for descricao in filhos:
+            codigo = pai + SEPARADOR + descricao
+            nos.append((codigo, descricao, nivel, pai))
+            self.folhas[(tipo, descricao)] = codigo
+    
+    def consolidacao(self, tipos, descricoes):
+        """
+        Classifica os lançamentos nas contas do plano.
+        
+        Args:
+            tipos: Series com o tipo de cada lançamento
+            descricoes: Series com a descrição de cada lançamento
+        
+        Returns:
+            Consolidacao: Contas, folha de cada lançamento e matriz de agregação
+        """
+        # Um código por par distinto (tipo, descrição); o laço abaixo percorre
+        # só os pares distintos
+        codigos, pares = pd.factorize(pd.MultiIndex.from_arrays([tipos.astype(str), descricoes.astype(str)]))
+        
+        nos = []
+        pais = {}
+        posicoes = {}
+        for tipo in TIPOS:
+            configurados = self.nos_por_tipo[tipo]
+            novos = []
+            
+            # Descrições do tipo que não estão no plano ficam em um grupo próprio
+            grupo = tipo + SEPARADOR + NAO_CLASSIFICADO
+            for tipo_par, descricao in pares:
+                if tipo_par == tipo and (tipo, descricao) not in self.folhas:
+                    if not novos and not any(no[0] == grupo for no in configurados):
+                        novos.append((grupo, NAO_CLASSIFICADO, 1, tipo))
+                    novos.append((grupo + SEPARADOR + descricao, descricao, 2, grupo))
+            
+            for codigo, nome, nivel, pai in configurados + novos:
+                posicoes[codigo] = len(nos)
+                pais[codigo] = pai
+                nos.append((codigo, nome, nivel))
+        
+        # Pares (ancestral, folha) de cada folha presente; pares com tipo
+        # desconhecido não entram em nenhuma conta
+        ancestrais = []
+        colunas = []
+        for coluna, (tipo, descricao) in enumerate(pares):
+            if tipo not in self.nos_por_tipo:
+                continue
+            
+            codigo = self.folhas.get((tipo, descricao), tipo + SEPARADOR + NAO_CLASSIFICADO + SEPARADOR + descricao)
+            while codigo is not None:
+                ancestrais.append(posicoes[codigo])
+                colunas.append(coluna)
+                codigo = pais[codigo]
+        
+        return Consolidacao(
+            nos,
+            pd.Series(codigos, index=tipos.index),
+            len(pares),
+            np.array(ancestrais, dtype='int64'),
+            np.array(colunas, dtype='int64')
+        )
+
+def carregar_plano_contas(caminho=None):
+    """
+    Carrega o plano de contas configurado ou o plano padrão.
+    
+    Args:
+        caminho: Arquivo JSON com a estrutura do plano (padrão: PLANO_CONTAS_PATH)
+    
+    Returns:
+        PlanoContas: Plano configurado, ou o padrão se o arquivo não existir
+    """
+    caminho = caminho or PLANO_CONTAS_PATH
+    if not os.path.exists(caminho):
+        return PlanoContas()
+    
+    with open(caminho, encoding='utf-8') as arquivo:
+        return PlanoContas(json.load(arquivo))
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+from src.dre_calculator import TIPOS, COLUNAS_DRE
+
+# Percentis calculados por padrão (faixas de 5-95 e 25-75 e a mediana)
+PERCENTIS_PADRAO = (5, 25, 50, 75, 95)
+
+# Meses recentes cuja média é o ponto de partida da projeção
+MESES_NIVEL = 3
+
+# Semente usada pelo app: a projeção (e a figura em cache) não muda a cada rerun
+SEMENTE_PADRAO = 0
+
+def _ajustar(valores):
+    """
+    Estima o crescimento mensal e a volatilidade de cada linha do DRE.
+    
+    Usa os retornos logarítmicos entre meses consecutivos com valores
+    positivos. Linhas sem histórico suficiente ficam com crescimento e
+    volatilidade zero (a projeção repete o último valor).
+    
+    Args:
+        valores: Array (meses, linhas) com o histórico
+    
+    Returns:
+        tuple: (crescimento médio por linha, covariância dos retornos)
+    """
+    linhas = valores.shape[1]
+    
+    # Retornos logarítmicos; meses com valor não positivo ficam de fora
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retornos = np.diff(np.log(np.where(valores > 0, valores, np.nan)), axis=0)
+    
+    validos = np.isfinite(retornos)
+    contagem = validos.sum(axis=0)
+    zerados = np.where(validos, retornos, 0.0)
+    
+    crescimento = np.divide(zerados.sum(axis=0), contagem, out=np.zeros(linhas), where=contagem > 0)
+    
+    # Covariância entre as linhas (pares de meses válidos em ambas)
+    desvios = np.where(validos, retornos - crescimento, 0.0)
+    pares = validos.T.astype(float) @ validos.astype(float)
+    covariancia = np.divide(desvios.T @ desvios, pares - 1, out=np.zeros((linhas, linhas)), where=pares > 1)
+    
+    return crescimento, covariancia
+
+def _fator_covariancia(covariancia):
+    """
+    Retorna A tal que A @ A.T é a covariância (usada para correlacionar choques).
+    
+    Usa a decomposição espectral, que também aceita matrizes só semidefinidas
+    (linhas sem variação), ao contrário de Cholesky.
+    """
+    # Autovalores negativos (erro numérico) viram zero
+    autovalores, autovetores = np.linalg.eigh(covariancia)
+    autovalores = np.clip(autovalores, 0, None)
+    
+    return autovetores * np.sqrt(autovalores)
+
+def _proximos_meses(ultimo, meses):
+    """Rótulos YYYY-MM dos meses seguintes ao último mês do histórico."""
+    inicio = np.datetime64(ultimo, 'M') + 1
+    return list(np.datetime_as_string(np.arange(inicio, inicio + meses), unit='M'))
+
+def _sem_mes_incompleto(dre_mensal, referencia):
+    """
+    Remove o último mês do histórico se ele ainda não terminou na data de referência.
+    
+    Args:
+        dre_mensal: DRE mensal (índice com rótulos YYYY-MM)
+        referencia: Data de referência (padrão: hoje)
+    
+    Returns:
+        DataFrame: DRE mensal só com meses completos
+    """
+    referencia = pd.Timestamp(referencia if referencia is not None else pd.Timestamp.today()).normalize()
+    ultimo = pd.Period(dre_mensal.index[-1], freq='M')
+    
+    if referencia < ultimo.end_time.normalize():
+        return dre_mensal.iloc[:-1]
+    
+    return dre_mensal
+
+def projetar_dre(dre_mensal, meses=12, cenarios=10_000, percentis=PERCENTIS_PADRAO, seed=None,
+                 descartar_incompleto=True, referencia=None):
+    """
+    Projeta o DRE dos próximos meses por simulação de Monte Carlo.
+    
+    Receita, custo e despesa seguem passeios aleatórios log-normais com o
+    crescimento e a covariância estimados no histórico. Os lucros são
+    calculados em cada cenário antes dos percentis. Toda a simulação é feita
+    em arrays (cenários x meses x linhas), sem laços por cenário.
+    
+    Args:
+        dre_mensal: DRE mensal de calcular_dre (índice com rótulos YYYY-MM)
+        meses: Número de meses projetados
+        cenarios: Número de cenários simulados
+        percentis: Percentis calculados para cada mês e linha
+        seed: Semente do gerador aleatório (opcional)
+        descartar_incompleto: Se True, o último mês fica fora do ajuste quando
+            ainda não terminou na data de referência; a projeção começa nele
+        referencia: Data que define se o último mês terminou (padrão: hoje)
+    
+    Returns:
+        dict: 'meses' (rótulos YYYY-MM), 'percentis' ({percentil: DataFrame
+        meses x COLUNAS_DRE}) e 'media' (DataFrame meses x COLUNAS_DRE), ou
+        None se não houver histórico
+    """
+    if dre_mensal is None or dre_mensal.empty:
+        return None
+    
+    # Um mês ainda em curso puxaria o nível para baixo e entraria no
+    # crescimento como um retorno muito negativo
+    if descartar_incompleto:
+        dre_mensal = _sem_mes_incompleto(dre_mensal, referencia)
+        if dre_mensal.empty:
+            return None
+    
+    historico = dre_mensal[TIPOS].to_numpy(dtype=float)
+    crescimento, covariancia = _ajustar(historico)
+    fator = _fator_covariancia(covariancia)
+    
+    # Choques correlacionados entre as linhas: (cenários, meses, linhas)
+    rng = np.random.default_rng(seed)
+    choques = rng.standard_normal((cenarios, meses, len(TIPOS))) @ fator.T
+    
+    # Caminhos log-normais a partir do nível atual (média dos últimos meses)
+    nivel = historico[-MESES_NIVEL:].mean(axis=0)
+    trajetorias = nivel * np.exp(np.cumsum(crescimento + choques, axis=1))
+    
+    # Lucros por cenário: (cenários, meses, COLUNAS_DRE)
+    lucro_bruto = trajetorias[..., 0] - trajetorias[..., 1]
+    lucro_liquido = lucro_bruto - trajetorias[..., 2]
+    simulacao = np.concatenate([trajetorias, lucro_bruto[..., None], lucro_liquido[..., None]], axis=2)
+    
+    rotulos = pd.Index(_proximos_meses(dre_mensal.index[-1], meses), name='mes')
+    quantis = np.percentile(simulacao, percentis, axis=0)
+    
+    return {
+        'meses': list(rotulos),
+        'percentis': {
+            percentil: pd.DataFrame(quantis[i], index=rotulos, columns=COLUNAS_DRE)
+            for i, percentil in enumerate(percentis)
+        },
+        'media': pd.DataFrame(simulacao.mean(axis=0), index=rotulos, columns=COLUNAS_DRE)
+    }
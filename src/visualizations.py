@@ -1,17 +1,266 @@
 import plotly.graph_objects as go
 import plotly.express as px
+import hashlib
+import json
+import threading
+import numpy as np
 import pandas as pd
+from collections import OrderedDict
 
-def criar_grafico_evolucao(dre_mensal):
+from src.filtros import filtrar
+
+# O plotly importa o orjson sob demanda ao serializar figuras e devolve o que
+# estiver em sys.modules; importado aqui, duas execuções simultâneas da página
+# não encontram o módulo ainda pela metade
+try:
+    import orjson  # noqa: F401
+except ImportError:
+    pass
+
+# Linhas do gráfico de evolução: (coluna, cor, espessura)
+LINHAS_EVOLUCAO = [
+    ('Receita', 'green', 2),
+    ('Custo', 'red', 2),
+    ('Despesa', 'orange', 2),
+    ('Lucro Líquido', 'blue', 3)
+]
+
+# Acima deste número de períodos o gráfico usa WebGL (Scattergl) e cada linha
+# é reduzida no servidor para no máximo PONTOS_MAXIMOS pontos
+LIMITE_PONTOS_WEBGL = 1000
+PONTOS_MAXIMOS = 2000
+
+# Fatias do gráfico de despesas; as demais descrições são somadas em "Outros"
+TOP_N_DESPESAS = 10
+ROTULO_OUTROS = "Outros"
+
+# Tamanho máximo (bytes de JSON) das figuras mantidas no cache
+CACHE_FIGURAS_MAX_BYTES = 16 * 1024 * 1024
+
+# Cache de figuras: chave (gráfico, hash do conteúdo) -> JSON da figura
+_cache_figuras = OrderedDict()
+_cache_figuras_lock = threading.Lock()
+_estatisticas_figuras = {'acertos': 0, 'falhas': 0, 'bytes': 0}
+
+# Linhas com faixa de projeção e suas cores (RGB)
+LINHAS_PROJECAO = [
+    ('Receita', '0, 128, 0'),
+    ('Custo', '255, 0, 0'),
+    ('Despesa', '255, 165, 0'),
+    ('Lucro Líquido', '0, 0, 255')
+]
+
+def _hash_conteudo(*partes):
+    """
+    Calcula um hash do conteúdo das entradas de um gráfico.
+    
+    DataFrames e Series entram pelos valores, índice e nomes das colunas;
+    dicionários, listas e tuplas, item a item; os demais valores, pelo repr.
+    """
+    hash_ = hashlib.blake2b(digest_size=16)
+    
+    def adicionar(parte):
+        if isinstance(parte, (pd.DataFrame, pd.Series)):
+            hash_.update(type(parte).__name__.encode())
+            hash_.update(repr(list(parte.columns) if isinstance(parte, pd.DataFrame) else parte.name).encode())
+            hash_.update(repr(parte.index.names).encode())
+            hash_.update(pd.util.hash_pandas_object(parte, index=True).to_numpy().tobytes())
+        elif isinstance(parte, dict):
+            hash_.update(b'{')
+            for chave, valor in parte.items():
+                adicionar(chave)
+                adicionar(valor)
+            hash_.update(b'}')
+        elif isinstance(parte, (list, tuple)):
+            hash_.update(b'[')
+            for item in parte:
+                adicionar(item)
+            hash_.update(b']')
+        else:
+            hash_.update(repr(parte).encode())
+        hash_.update(b'|')
+    
+    for parte in partes:
+        adicionar(parte)
+    
+    return hash_.hexdigest()
+
+def _figura_em_cache(grafico, entradas, criar):
+    """
+    Retorna a figura do cache ou a cria e guarda o JSON serializado.
+    
+    A figura devolvida é sempre uma cópia, reconstruída do JSON sem nova
+    validação (_validate=False): o JSON veio de uma figura já validada, e
+    validá-la de novo custaria mais do que montar a figura do zero. O
+    chamador pode alterá-la sem afetar o cache.
+    
+    Args:
+        grafico: Nome do gráfico (parte da chave)
+        entradas: Dados agregados e opções que determinam a figura
+        criar: Função sem argumentos que monta a figura
+    
+    Returns:
+        plotly.graph_objects.Figure: Figura pronta
+    """
+    chave = (grafico, _hash_conteudo(*entradas))
+    
+    with _cache_figuras_lock:
+        conteudo = _cache_figuras.get(chave)
+        if conteudo is not None:
+            _cache_figuras.move_to_end(chave)
+            _estatisticas_figuras['acertos'] += 1
+        else:
+            _estatisticas_figuras['falhas'] += 1
+    
+    if conteudo is None:
+        conteudo = criar().to_json()
+        
+        # Figuras maiores que o cache inteiro não são guardadas
+        if len(conteudo) <= CACHE_FIGURAS_MAX_BYTES:
+            with _cache_figuras_lock:
+                anterior = _cache_figuras.pop(chave, None)
+                if anterior is not None:
+                    _estatisticas_figuras['bytes'] -= len(anterior)
+                
+                _cache_figuras[chave] = conteudo
+                _estatisticas_figuras['bytes'] += len(conteudo)
+                
+                # Descarta as figuras menos usadas até caber no limite
+                while _estatisticas_figuras['bytes'] > CACHE_FIGURAS_MAX_BYTES:
+                    _, removido = _cache_figuras.popitem(last=False)
+                    _estatisticas_figuras['bytes'] -= len(removido)
+    
+    return go.Figure(json.loads(conteudo), _validate=False)
+
+def limpar_cache_figuras():
+    """Descarta as figuras em cache."""
+    with _cache_figuras_lock:
+        _cache_figuras.clear()
+        _estatisticas_figuras['bytes'] = 0
+
+def estatisticas_cache_figuras():
+    """
+    Retorna os contadores do cache de figuras.
+    
+    Returns:
+        dict: 'acertos', 'falhas', 'entradas', 'bytes' (JSON guardado),
+        'max_bytes' e 'taxa_acerto' (0 a 1)
+    """
+    with _cache_figuras_lock:
+        acertos = _estatisticas_figuras['acertos']
+        falhas = _estatisticas_figuras['falhas']
+        entradas = len(_cache_figuras)
+        tamanho = _estatisticas_figuras['bytes']
+    
+    consultas = acertos + falhas
+    return {
+        'acertos': acertos,
+        'falhas': falhas,
+        'entradas': entradas,
+        'bytes': tamanho,
+        'max_bytes': CACHE_FIGURAS_MAX_BYTES,
+        'taxa_acerto': acertos / consultas if consultas else 0.0
+    }
+
+def _adicionar_projecao(fig, projecao):
+    """
+    Acrescenta ao gráfico a mediana e as faixas de percentis da projeção.
+    
+    Para cada linha, a faixa externa vai do menor ao maior percentil e a
+    interna do segundo ao penúltimo (por padrão, 5-95 e 25-75).
+    """
+    percentis = sorted(projecao['percentis'])
+    faixas = [(percentis[0], percentis[-1], 0.12)]
+    if len(percentis) >= 4:
+        faixas.append((percentis[1], percentis[-2], 0.22))
+    
+    meses = projecao['meses']
+    for linha, rgb in LINHAS_PROJECAO:
+        for inferior, superior, opacidade in faixas:
+            fig.add_trace(go.Scatter(
+                x=meses,
+                y=projecao['percentis'][inferior][linha],
+                line=dict(width=0),
+                hoverinfo='skip',
+                showlegend=False
+            ))
+            fig.add_trace(go.Scatter(
+                x=meses,
+                y=projecao['percentis'][superior][linha],
+                fill='tonexty',
+                fillcolor=f'rgba({rgb}, {opacidade})',
+                line=dict(width=0),
+                name=f'{linha} (P{inferior}-P{superior})',
+                legendgroup=linha,
+                showlegend=False
+            ))
+        
+        mediana = projecao['percentis'][50] if 50 in projecao['percentis'] else projecao['media']
+        fig.add_trace(go.Scatter(
+            x=meses,
+            y=mediana[linha],
+            name=f'{linha} (projeção)',
+            legendgroup=linha,
+            line=dict(color=f'rgb({rgb})', width=2, dash='dash')
+        ))
+
+def _reduzir_pontos(valores, alvo):
+    """
+    Escolhe até alvo pontos de uma série preservando picos e vales.
+    
+    Divide a série em baldes de tamanho igual e mantém, de cada balde, as
+    posições do menor e do maior valor, além do primeiro e do último ponto.
+    
+    Args:
+        valores: Array com os valores da série
+        alvo: Número máximo de pontos
+    
+    Returns:
+        numpy.ndarray: Posições escolhidas, em ordem crescente
+    """
+    total = len(valores)
+    if total <= alvo:
+        return np.arange(total)
+    
+    # Pontos internos (sem o primeiro e o último) em baldes de mesmo tamanho
+    internos = np.asarray(valores[1:-1], dtype='float64')
+    baldes = max(1, (alvo - 2) // 2)
+    tamanho = -(-len(internos) // baldes)
+    baldes = -(-len(internos) // tamanho)
+    sobra = baldes * tamanho - len(internos)
+    
+    menores = np.append(np.where(np.isnan(internos), np.inf, internos), np.full(sobra, np.inf)).reshape(baldes, tamanho)
+    maiores = np.append(np.where(np.isnan(internos), -np.inf, internos), np.full(sobra, -np.inf)).reshape(baldes, tamanho)
+    inicios = np.arange(baldes) * tamanho + 1
+    
+    posicoes = np.concatenate([[0], inicios + menores.argmin(axis=1), inicios + maiores.argmax(axis=1), [total - 1]])
+    return np.unique(np.minimum(posicoes, total - 1))
+
+def criar_grafico_evolucao(dre_mensal, projecao=None, max_pontos=PONTOS_MAXIMOS):
     """
     Cria gráfico de evolução mensal de receitas, custos e lucros.
     
+    Séries com mais de LIMITE_PONTOS_WEBGL períodos (por exemplo, o DRE
+    diário de vários anos) usam traços WebGL e são reduzidas no servidor a
+    max_pontos pontos por linha, mantendo mínimos e máximos.
+    
     Args:
         dre_mensal: DataFrame com o DRE mensal
+        projecao: Resultado de src.projecao.projetar_dre para exibir as faixas
+            de percentis dos próximos meses (opcional)
+        max_pontos: Número máximo de pontos por linha no modo WebGL
         
     Returns:
         plotly.graph_objects.Figure: Gráfico de evolução
     """
+    return _figura_em_cache(
+        'evolucao',
+        (dre_mensal, projecao, max_pontos),
+        lambda: _criar_grafico_evolucao(dre_mensal, projecao, max_pontos)
+    )
+
+def _criar_grafico_evolucao(dre_mensal, projecao, max_pontos):
+    """Monta o gráfico de evolução (sem cache; veja criar_grafico_evolucao)."""
     import plotly.graph_objects as go
     
     # Verificação se o DataFrame está vazio
@@ -38,7 +287,8 @@ def criar_grafico_evolucao(dre_mensal):
     try:
         # Prepara os dados - Importante: Garantimos que o índice seja usado como coluna 'mes'
         # Isso resolve o problema de KeyError: 'mes'
-        df = dre_mensal.reset_index()
+        # Só as colunas desenhadas seguem para o gráfico
+        df = dre_mensal[[coluna for coluna, _, _ in LINHAS_EVOLUCAO]].reset_index()
         
         # Verifica se a coluna do índice tem o nome correto
         if 'index' in df.columns and 'mes' not in df.columns:
@@ -51,34 +301,29 @@ def criar_grafico_evolucao(dre_mensal):
         # Cria o gráfico
         fig = go.Figure()
         
-        # Adiciona linhas para cada métrica
-        fig.add_trace(go.Scatter(
-            x=df['mes'], 
-            y=df['Receita'], 
-            name='Receita',
-            line=dict(color='green', width=2)
-        ))
+        # Séries longas: WebGL e redução dos pontos antes de enviar ao navegador
+        grande = len(df) > LIMITE_PONTOS_WEBGL
+        traco = go.Scattergl if grande else go.Scatter
+        meses = df['mes'].to_numpy()
         
-        fig.add_trace(go.Scatter(
-            x=df['mes'], 
-            y=df['Custo'], 
-            name='Custo',
-            line=dict(color='red', width=2)
-        ))
+        # Adiciona linhas para cada métrica
+        for coluna, cor, largura in LINHAS_EVOLUCAO:
+            x = meses
+            y = df[coluna].to_numpy()
+            if grande:
+                posicoes = _reduzir_pontos(y, max_pontos)
+                x, y = x[posicoes], y[posicoes]
         
-        fig.add_trace(go.Scatter(
-            x=df['mes'], 
-            y=df['Despesa'], 
-            name='Despesa',
-            line=dict(color='orange', width=2)
-        ))
+            fig.add_trace(traco(
+                x=x,
+                y=y,
+                name=coluna,
+                line=dict(color=cor, width=largura)
+            ))
         
-        fig.add_trace(go.Scatter(
-            x=df['mes'], 
-            y=df['Lucro Líquido'], 
-            name='Lucro Líquido',
-            line=dict(color='blue', width=3)
-        ))
+        # Faixas da projeção de Monte Carlo
+        if projecao:
+            _adicionar_projecao(fig, projecao)
         
         # Atualiza layout
         fig.update_layout(
@@ -94,7 +339,8 @@ def criar_grafico_evolucao(dre_mensal):
     except KeyError as e:
         # Log do erro para debugging
         print(f"Erro ao criar gráfico de evolução: {e}")
-        print(f"Colunas disponíveis: {df.columns.tolist()}")
+        # dre_mensal (e não df): a seleção das colunas pode ter falhado antes de df existir
+        print(f"Colunas disponíveis: {dre_mensal.reset_index().columns.tolist()}")
         
         # Retorna um gráfico com mensagem de erro
         fig = go.Figure()
@@ -138,44 +384,77 @@ def criar_grafico_evolucao(dre_mensal):
         )
         return fig
 
-def criar_grafico_distribuicao_despesas(df, empresa=None, periodo=None):
+def despesas_por_descricao(df, empresa=None, periodo=None):
     """
-    Cria gráfico de pizza para distribuição das despesas.
+    Soma as despesas por descrição (entrada pré-agregada do gráfico de despesas).
     
     Args:
-        df: DataFrame com os lançamentos
+        df: DataFrame com os lançamentos ou com as células do cubo mensal
         empresa: Nome da empresa para filtrar (opcional)
         periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
         
     Returns:
-        plotly.graph_objects.Figure: Gráfico de distribuição de despesas
+        pandas.Series: Valor total por descrição
     """
-    # Filtra dados
-    dados = df.copy()
-    
-    # Filtra por empresa
-    if empresa:
-        dados = dados[dados['empresa'] == empresa]
-    
-    # Filtra por período
-    if periodo and len(periodo) == 2:
-        # Converte datas para string se forem objetos datetime
-        inicio = periodo[0]
-        fim = periodo[1]
-        
-        if hasattr(inicio, 'strftime'):
-            inicio = inicio.strftime('%Y-%m-%d')
-        
-        if hasattr(fim, 'strftime'):
-            fim = fim.strftime('%Y-%m-%d')
-        
-        dados = dados[(dados['data'] >= inicio) & (dados['data'] <= fim)]
+    # Filtra por empresa e período
+    dados = filtrar(df, empresa, periodo)
     
     # Filtra apenas despesas
     dados = dados[dados['tipo'] == 'Despesa']
     
+    return dados.groupby('descricao', observed=True)['valor'].sum()
+
+def _maiores_despesas(despesas, top_n):
+    """
+    Mantém as top_n maiores despesas e soma as demais em ROTULO_OUTROS.
+    
+    A seleção usa argpartition (sem ordenar todas as descrições); só as
+    top_n escolhidas são ordenadas.
+    
+    Returns:
+        DataFrame: Colunas 'descricao' e 'valor', em ordem decrescente de valor
+    """
+    descricoes = despesas.index.astype(str).to_numpy()
+    valores = despesas.to_numpy(dtype='float64')
+    
+    if top_n is None or len(valores) <= top_n:
+        ordem = np.argsort(-valores, kind='stable')
+        return pd.DataFrame({'descricao': descricoes[ordem], 'valor': valores[ordem]})
+    
+    maiores = np.argpartition(-valores, top_n - 1)[:top_n]
+    maiores = maiores[np.argsort(-valores[maiores], kind='stable')]
+    outros = valores.sum() - valores[maiores].sum()
+    
+    return pd.DataFrame({
+        'descricao': np.append(descricoes[maiores], ROTULO_OUTROS),
+        'valor': np.append(valores[maiores], outros)
+    })
+
+def criar_grafico_distribuicao_despesas(df, empresa=None, periodo=None, top_n=TOP_N_DESPESAS):
+    """
+    Cria gráfico de pizza para distribuição das despesas.
+    
+    Exibe as top_n maiores descrições e agrupa as demais em "Outros", o que
+    limita o número de fatias com descrições livres.
+    
+    Args:
+        df: DataFrame com os lançamentos ou com as células do cubo mensal, ou
+            as somas por descrição já calculadas (Series de
+            despesas_por_descricao; nesse caso empresa e período são ignorados)
+        empresa: Nome da empresa para filtrar (opcional)
+        periodo: Tuple (data_inicio, data_fim) para filtrar (opcional)
+        top_n: Número máximo de fatias antes de "Outros" (None para todas)
+    
+    Returns:
+        plotly.graph_objects.Figure: Gráfico de distribuição de despesas
+    """
+    if isinstance(df, pd.Series):
+        despesas = df
+    else:
+        despesas = despesas_por_descricao(df, empresa, periodo)
+    
     # Se não houver dados, retorna um gráfico vazio
-    if dados.empty:
+    if despesas.empty:
         fig = go.Figure()
         fig.update_layout(
             title="Sem despesas para exibir",
@@ -184,8 +463,12 @@ def criar_grafico_distribuicao_despesas(df, empresa=None, periodo=None):
         )
         return fig
     
-    # Agrupa por descrição
-    despesas_por_categoria = dados.groupby('descricao')['valor'].sum().reset_index()
+    return _figura_em_cache('despesas', (despesas, top_n), lambda: _criar_grafico_despesas(despesas, top_n))
+
+def _criar_grafico_despesas(despesas, top_n):
+    """Monta o gráfico de pizza das despesas (sem cache)."""
+    # Agrupa as descrições menores em "Outros"
+    despesas_por_categoria = _maiores_despesas(despesas, top_n)
     
     # Cria gráfico
     fig = px.pie(
@@ -198,3 +481,32 @@ def criar_grafico_distribuicao_despesas(df, empresa=None, periodo=None):
     )
     
     return fig
+
+def criar_grafico_comparacao(resultados):
+    """
+    Cria gráfico de barras comparando os totais do DRE entre empresas.
+    
+    Args:
+        resultados: Dicionário empresa -> resultado de calcular_dre (como o
+            de calcular_dre_multi)
+    
+    Returns:
+        plotly.graph_objects.Figure: Gráfico de comparação
+    """
+    # Formato longo: empresa × métrica
+    df_comparacao = pd.DataFrame(
+        [(empresa_nome, metrica, valor)
+         for empresa_nome, resultado in resultados.items()
+         for metrica, valor in resultado['totais'].items()],
+        columns=['Empresa', 'Métrica', 'Valor']
+    )
+    
+    return _figura_em_cache('comparacao', (df_comparacao,), lambda: px.bar(
+        df_comparacao, 
+        x='Empresa', 
+        y='Valor', 
+        color='Métrica',
+        barmode='group',
+        title='Comparação entre Empresas',
+        labels={'Valor': 'Valor (R$)'}
+    ))
@@ -0,0 +1,157 @@
+import multiprocessing
+import os
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from src import data_manager
+from src.data_manager import CSVStorage, PartitionedStorage, SQLiteStorage
+
+PROCESSOS = 4
+ESCRITAS = 100
+
+# Limite baixo para que o CSV também seja compactado durante as escritas
+LIMITE_COMPACTACAO = 16 * 1024
+
+def _criar_storage(backend, diretorio):
+    """Backend isolado no diretório do teste."""
+    if backend == CSVStorage.nome:
+        return CSVStorage(
+            os.path.join(diretorio, "user_data.csv"),
+            os.path.join(diretorio, "user_data.segment.csv"),
+            LIMITE_COMPACTACAO
+        )
+    if backend == SQLiteStorage.nome:
+        return SQLiteStorage(os.path.join(diretorio, "user_data.db"))
+    return PartitionedStorage(os.path.join(diretorio, "particoes"))
+
+def _escritor(backend, diretorio, processo, largada):
+    """Processo escritor: grava ESCRITAS lançamentos, um por vez."""
+    data_manager.configurar_armazenamento(_criar_storage(backend, diretorio))
+    largada.wait()
+    
+    for i in range(ESCRITAS):
+        data_manager.add_transaction(f"Processo {processo}", '2024-01-01', 'Receita', f"{processo}-{i}", 1.0 + i)
+
+@pytest.fixture
+def storage_isolado(monkeypatch):
+    # Restaura o backend global ao final do teste
+    monkeypatch.setattr(data_manager, '_storage', None)
+
+@pytest.mark.parametrize('backend', [CSVStorage.nome, SQLiteStorage.nome, PartitionedStorage.nome])
+def test_escritas_concorrentes_nao_perdem_lancamentos(backend, tmp_path, storage_isolado):
+    storage = data_manager.configurar_armazenamento(_criar_storage(backend, str(tmp_path)))
+    storage.inicializar()
+    
+    largada = multiprocessing.Event()
+    escritores = [
+        multiprocessing.Process(target=_escritor, args=(backend, str(tmp_path), processo, largada))
+        for processo in range(PROCESSOS)
+    ]
+    for escritor in escritores:
+        escritor.start()
+    
+    # Libera todos os processos ao mesmo tempo
+    largada.set()
+    for escritor in escritores:
+        escritor.join()
+    
+    assert [escritor.exitcode for escritor in escritores] == [0] * PROCESSOS
+    
+    # Livro: cada lançamento gravado exatamente uma vez, com IDs distintos
+    # entre os processos (no SQLite um ID repetido seria recusado)
+    assert data_manager.get_transactions()['id'].is_unique
+    gravadas = data_manager.get_transactions()['descricao'].astype(str).tolist()
+    esperadas = {f"{processo}-{i}" for processo in range(PROCESSOS) for i in range(ESCRITAS)}
+    assert len(gravadas) == len(esperadas)
+    assert set(gravadas) == esperadas
+    
+    # Cubo: as somas mensais mantidas pelos escritores acompanham o livro
+    assert os.path.exists(storage.cubo)
+    assert data_manager.verificar_cubo()['consistente']
+
+def test_exportacao_incremental_inclui_ids_importados_e_lancamentos_retroativos(tmp_path, monkeypatch, storage_isolado):
+    monkeypatch.setattr(data_manager, 'EXPORT_MARKER_PATH', str(tmp_path / "ultima_exportacao.json"))
+    monkeypatch.setattr(data_manager, 'EXPORT_IDS_PATH', str(tmp_path / "ultima_exportacao.ids"))
+    storage = data_manager.configurar_armazenamento(_criar_storage(CSVStorage.nome, str(tmp_path)))
+    storage.inicializar()
+    
+    data_manager.add_transaction('A', '2024-05-01', 'Receita', 'primeira', 1.0)
+    ids = str(tmp_path / "exportacao.ids")
+    assert data_manager.exportar_transacoes(str(tmp_path / "1.csv"), incremental=True, arquivo_ids=ids)['linhas'] == 1
+    data_manager.salvar_marcador_exportacao(ids)
+    
+    # ID menor que os já exportados e data anterior à da última exportação
+    importacao = tmp_path / "importacao.csv"
+    importacao.write_text("id,empresa,data,tipo,descricao,valor\n5,A,2020-01-01,Custo,importada,2.0\n")
+    assert data_manager.import_csv(str(importacao), quarentena=None)[0]
+    data_manager.add_transaction('A', '2019-01-01', 'Receita', 'retroativa', 3.0)
+    
+    exportacao = tmp_path / "2.csv"
+    data_manager.exportar_transacoes(str(exportacao), incremental=True, arquivo_ids=ids)
+    data_manager.salvar_marcador_exportacao(ids)
+    
+    assert sorted(pd.read_csv(exportacao)['descricao']) == ['importada', 'retroativa']
+    assert data_manager.exportar_transacoes(str(tmp_path / "3.csv"), incremental=True)['linhas'] == 0
+    assert data_manager.ler_marcador_exportacao()['exportados'] == 3
+
+@pytest.mark.parametrize('backend', [CSVStorage.nome, SQLiteStorage.nome, PartitionedStorage.nome])
+def test_ids_gerados_sao_unicos_entre_processos(backend, tmp_path, monkeypatch, storage_isolado):
+    storage = data_manager.configurar_armazenamento(_criar_storage(backend, str(tmp_path)))
+    storage.inicializar()
+    
+    # Relógio parado, herdado pelos processos: todos veem o mesmo microssegundo
+    class RelogioParado(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2024, 1, 1)
+    
+    monkeypatch.setattr(data_manager, 'datetime', RelogioParado)
+    
+    with multiprocessing.Pool(PROCESSOS) as pool:
+        faixas = pool.starmap(_reservar_ids, [(backend, str(tmp_path))] * PROCESSOS * 4)
+    
+    ids = [id_ for faixa in faixas for id_ in faixa]
+    assert len(ids) == len(set(ids))
+
+def _reservar_ids(backend, diretorio):
+    """Reserva uma faixa de IDs em um processo do pool."""
+    data_manager.configurar_armazenamento(_criar_storage(backend, diretorio))
+    return data_manager._gerar_ids(50)
+
+def test_id_repetido_no_sqlite_gera_erro(tmp_path, storage_isolado):
+    storage = data_manager.configurar_armazenamento(_criar_storage(SQLiteStorage.nome, str(tmp_path)))
+    storage.inicializar()
+    linha = {'id': 1, 'empresa': 'A', 'data': '2024-01-01', 'tipo': 'Receita', 'descricao': 'x', 'valor': 10.0}
+    
+    data_manager.add_transactions([linha])
+    with pytest.raises(ValueError, match="IDs já existentes"):
+        data_manager.add_transactions([linha, {**linha, 'id': 2}])
+    
+    # A linha nova foi gravada, e o cubo acompanha o livro
+    assert sorted(data_manager.get_transactions()['id']) == [1, 2]
+    assert data_manager.verificar_cubo()['consistente']
+
+def test_particionado_normaliza_datas_e_recusa_linhas_sem_particao(tmp_path, storage_isolado):
+    storage = data_manager.configurar_armazenamento(_criar_storage(PartitionedStorage.nome, str(tmp_path)))
+    storage.inicializar()
+    
+    data_manager.add_transactions(pd.DataFrame({
+        'empresa': ['A', 'A'],
+        'data': [pd.Timestamp('2024-03-05'), '05/06/2024'],
+        'tipo': ['Receita', 'Custo'],
+        'descricao': ['x', 'y'],
+        'valor': [1.0, 2.0]
+    }))
+    
+    assert sorted(os.listdir(tmp_path / "particoes" / "A")) == ['2024-03.csv', '2024-06.csv']
+    assert sorted(data_manager.get_transactions()['data'].dt.strftime('%Y-%m-%d')) == ['2024-03-05', '2024-06-05']
+    
+    with pytest.raises(ValueError, match="empresa vazia"):
+        data_manager.add_transaction(None, '2024-01-01', 'Receita', 'z', 1.0)
+    with pytest.raises(ValueError, match="data inválida"):
+        data_manager.add_transaction('A', '2024-13-45', 'Receita', 'z', 1.0)
+    
+    assert len(data_manager.get_transactions()) == 2
+    assert data_manager.verificar_cubo()['consistente']
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data_manager import tipar_transacoes
+from src.dre_calculator import GRANULARIDADES, JANELAS, calcular_dre, calcular_dre_em_lotes
+
+@pytest.fixture(scope='module')
+def livro(tmp_path_factory):
+    """CSV com duas empresas e lançamentos de um tipo fora de TIPOS ('Outro')."""
+    rng = np.random.default_rng(0)
+    linhas = 5_000
+    datas = pd.Timestamp('2021-01-01') + pd.to_timedelta(rng.integers(0, 3 * 365, linhas), unit='D')
+    
+    df = pd.DataFrame({
+        'id': np.arange(1, linhas + 1),
+        'empresa': rng.choice(['A', 'B'], linhas),
+        'data': datas.strftime('%Y-%m-%d'),
+        'tipo': rng.choice(['Receita', 'Custo', 'Despesa', 'Outro'], linhas, p=[0.3, 0.2, 0.2, 0.3]),
+        'descricao': rng.choice(['x', 'y', 'z'], linhas),
+        'valor': rng.integers(1, 100_000, linhas) / 100
+    })
+    
+    caminho = tmp_path_factory.mktemp('livro') / "user_data.csv"
+    df.to_csv(caminho, index=False)
+    return str(caminho)
+
+@pytest.mark.parametrize('janela', [None] + JANELAS)
+@pytest.mark.parametrize('granularidade', GRANULARIDADES)
+def test_em_lotes_igual_a_calcular_dre(livro, granularidade, janela):
+    esperado = calcular_dre(tipar_transacoes(pd.read_csv(livro)), 'B', granularidade=granularidade, janela=janela)
+    obtido = calcular_dre_em_lotes(livro, 'B', granularidade=granularidade, janela=janela, tamanho_lote=700)
+    
+    pd.testing.assert_frame_equal(obtido['mensal'], esperado['mensal'])
+    assert dict(obtido['totais']) == dict(esperado['totais'])
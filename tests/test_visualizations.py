@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from src import visualizations
+from src.dre_calculator import calcular_dre
+
+def _lancamentos(meses=168, linhas=20_000, seed=0):
+    """Gera lançamentos de uma empresa espalhados por `meses` meses."""
+    rng = np.random.default_rng(seed)
+    datas = pd.Timestamp('2010-01-01') + pd.to_timedelta(rng.integers(0, meses * 30, linhas), unit='D')
+    
+    return pd.DataFrame({
+        'id': np.arange(linhas),
+        'empresa': 'A',
+        'data': datas.strftime('%Y-%m-%d'),
+        'tipo': rng.choice(['Receita', 'Custo', 'Despesa'], linhas),
+        'descricao': rng.choice([f"Conta {i}" for i in range(40)], linhas),
+        'valor': rng.random(linhas) * 1000
+    })
+
+def _variacao(antes, depois):
+    """Diferença dos contadores do cache entre duas leituras."""
+    return {chave: depois[chave] - antes[chave] for chave in ('acertos', 'falhas', 'entradas', 'bytes')}
+
+def test_segunda_chamada_acerta_o_cache():
+    mensal = calcular_dre(_lancamentos(), 'A')['mensal']
+    visualizations.limpar_cache_figuras()
+    
+    antes = visualizations.estatisticas_cache_figuras()
+    primeira = visualizations.criar_grafico_evolucao(mensal)
+    depois_falha = visualizations.estatisticas_cache_figuras()
+    segunda = visualizations.criar_grafico_evolucao(mensal)
+    depois_acerto = visualizations.estatisticas_cache_figuras()
+    
+    falha = _variacao(antes, depois_falha)
+    assert falha['falhas'] == 1 and falha['acertos'] == 0
+    assert falha['entradas'] == 1
+    assert falha['bytes'] == len(primeira.to_json())
+    
+    # O acerto não monta nem guarda uma nova figura
+    assert _variacao(depois_falha, depois_acerto) == {'acertos': 1, 'falhas': 0, 'entradas': 0, 'bytes': 0}
+    assert segunda.to_json() == primeira.to_json()
+
+def test_dados_diferentes_nao_acertam_o_cache():
+    despesas = visualizations.despesas_por_descricao(_lancamentos(linhas=2_000))
+    visualizations.limpar_cache_figuras()
+    
+    visualizations.criar_grafico_distribuicao_despesas(despesas)
+    antes = visualizations.estatisticas_cache_figuras()
+    visualizations.criar_grafico_distribuicao_despesas(despesas * 2)
+    
+    variacao = _variacao(antes, visualizations.estatisticas_cache_figuras())
+    assert variacao['falhas'] == 1 and variacao['acertos'] == 0
+    assert variacao['entradas'] == 1
+
+def test_cache_respeita_o_limite_de_bytes(monkeypatch):
+    mensal = calcular_dre(_lancamentos(linhas=2_000), 'A')['mensal']
+    visualizations.limpar_cache_figuras()
+    
+    tamanho = len(visualizations.criar_grafico_evolucao(mensal).to_json())
+    monkeypatch.setattr(visualizations, 'CACHE_FIGURAS_MAX_BYTES', tamanho)
+    
+    # Uma segunda figura não cabe junto com a primeira: a mais antiga sai
+    visualizations.criar_grafico_evolucao(mensal * 2)
+    estatisticas = visualizations.estatisticas_cache_figuras()
+    
+    assert estatisticas['entradas'] == 1
+    assert estatisticas['bytes'] <= tamanho
+
+def test_figura_do_cache_e_copia_independente():
+    despesas = visualizations.despesas_por_descricao(_lancamentos(linhas=500))
+    visualizations.limpar_cache_figuras()
+    
+    original = visualizations.criar_grafico_distribuicao_despesas(despesas).to_json()
+    alterada = visualizations.criar_grafico_distribuicao_despesas(despesas)
+    alterada.update_layout(title="Alterada")
+    
+    assert visualizations.criar_grafico_distribuicao_despesas(despesas).to_json() == original
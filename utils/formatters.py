@@ -1,4 +1,6 @@
 from datetime import datetime
+import numpy as np
+import pandas as pd
 
 def formatar_moeda(valor):
     """
@@ -47,6 +49,86 @@ def formatar_moeda(valor):
     
     return resultado
 
+# Formatos de data reconhecidos, na ordem de tentativa
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S']
+
+# Número de valores distintos usados para detectar o formato de uma coluna
+AMOSTRA_FORMATO_DATA = 1000
+
+# Potências de 10 usadas para contar os dígitos da parte inteira
+_POTENCIAS_10 = 10 ** np.arange(1, 19, dtype='int64')
+
+def formatar_moeda_serie(valores):
+    """
+    Formata uma coluna inteira como moeda brasileira (R$), sem laço por valor.
+    
+    O valor é arredondado para centavos uma única vez; os caracteres de todos
+    os valores (dígitos, pontos de milhar, vírgula e sinal) são montados em
+    uma matriz de bytes com operações sobre o array inteiro e convertidos
+    para texto de uma vez. Valores ausentes ou não numéricos viram "R$ 0,00",
+    como em formatar_moeda.
+    
+    Args:
+        valores: Series, array ou lista de valores numéricos
+    
+    Returns:
+        Series (mesmo índice, se a entrada for Series) ou numpy.ndarray de str
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(np.asarray(valores, dtype=object))
+    numeros = pd.to_numeric(serie, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    
+    # Centavos exatos (sem arredondar a parte decimal separadamente)
+    centavos = np.rint(np.abs(numeros) * 100)
+    centavos = np.where(np.isfinite(centavos) & (centavos < 1e18), centavos, 0).astype('int64')
+    inteiros, decimais = np.divmod(centavos, 100)
+    
+    # Sinal apenas para valores que não arredondam para zero
+    negativo = ((numeros < 0) & (centavos > 0)).astype('int64')
+    
+    # Caracteres da parte inteira: dígitos mais um ponto a cada três
+    digitos = 1 + np.searchsorted(_POTENCIAS_10, inteiros, side='right')
+    largura = digitos + (digitos - 1) // 3
+    
+    # "R$ " + sinal + parte inteira + "," + dois decimais
+    tamanhos = 3 + negativo + largura + 3
+    colunas = int(tamanhos.max(initial=7))
+    
+    # Dígitos ASCII da parte inteira (conversão do numpy), alinhados à esquerda
+    texto_inteiros = inteiros.astype('S19').view('uint8').reshape(-1, 19)
+    
+    # Matriz alinhada à direita: a coluna p é o p-ésimo caractere a partir do
+    # fim, e na parte inteira (q >= 0) um a cada quatro caracteres é ponto
+    p = np.arange(colunas)
+    q = p - 3
+    ponto = (q % 4 == 3)
+    digito = np.clip(digitos[:, None] - 1 - (q - q // 4), 0, 18)
+    
+    caracteres = np.zeros((len(inteiros), colunas), dtype='uint8')
+    inteira = (q >= 0) & (q < largura[:, None])
+    np.copyto(caracteres, np.take_along_axis(texto_inteiros, digito, axis=1), where=inteira & ~ponto)
+    np.copyto(caracteres, ord('.'), where=inteira & ponto)
+    
+    caracteres[:, 0] = ord('0') + decimais % 10
+    caracteres[:, 1] = ord('0') + decimais // 10
+    caracteres[:, 2] = ord(',')
+    
+    # Prefixo "R$ " e sinal logo antes da parte inteira
+    depois = q - largura[:, None] - negativo[:, None]
+    prefixo = np.array([ord(' '), ord('$'), ord('R')], dtype='uint8')
+    np.copyto(caracteres, prefixo[np.clip(depois, 0, 2)], where=(depois >= 0) & (depois <= 2))
+    np.copyto(caracteres, ord('-'), where=(depois == -1) & (negativo[:, None] == 1))
+    
+    # Alinha à esquerda (bytes nulos à direita são descartados pelo tipo 'S')
+    origem = tamanhos[:, None] - 1 - p
+    alinhados = np.take_along_axis(caracteres, np.clip(origem, 0, None), axis=1)
+    alinhados[origem < 0] = 0
+    resultado = alinhados.view(f'S{colunas}').ravel().astype(str)
+    
+    if isinstance(valores, pd.Series):
+        return pd.Series(resultado, index=valores.index, name=valores.name, dtype=object)
+    
+    return resultado
+
 def formatar_data(data, formato_saida='%d/%m/%Y'):
     """
     Formata uma data para o formato especificado.
@@ -89,3 +171,87 @@ def formatar_data(data, formato_saida='%d/%m/%Y'):
     except Exception:
         # Em caso de erro, retorna a entrada original como string
         return str(data)
+
+def detectar_formato_data(valores):
+    """
+    Descobre qual dos FORMATOS_DATA interpreta mais valores de uma amostra.
+    
+    Args:
+        valores: Series, array ou lista de datas em texto
+    
+    Returns:
+        str: Formato detectado, ou None se nenhum interpretar os valores
+    """
+    amostra = pd.Series(valores).dropna().astype(str).iloc[:AMOSTRA_FORMATO_DATA]
+    
+    melhor = None
+    interpretados = 0
+    for formato in FORMATOS_DATA:
+        validos = int(pd.to_datetime(amostra, format=formato, errors='coerce').notna().sum())
+        if validos > interpretados:
+            melhor, interpretados = formato, validos
+        if validos == len(amostra):
+            break
+    
+    return melhor
+
+def interpretar_datas(valores):
+    """
+    Converte uma coluna de datas para datetime64, interpretando só os valores distintos.
+    
+    O formato é detectado uma vez por coluna (detectar_formato_data); valores
+    em outro formato são tentados com os demais FORMATOS_DATA. Como as datas
+    se repetem muito, o custo é proporcional ao número de datas distintas.
+    
+    Args:
+        valores: Series, array ou lista de datas (texto ou datetime)
+    
+    Returns:
+        Series: Datas como datetime64 (NaT para valores não reconhecidos), com
+        o mesmo índice se a entrada for Series
+    """
+    serie = valores if isinstance(valores, pd.Series) else pd.Series(valores)
+    codigos, unicos = pd.factorize(serie)
+    
+    if isinstance(unicos, pd.DatetimeIndex):
+        datas = unicos.tz_localize(None) if unicos.tz is not None else unicos
+    else:
+        textos = pd.Series(unicos).astype(str)
+        datas = pd.Series(pd.NaT, index=textos.index, dtype='datetime64[ns]')
+        
+        # Formato principal primeiro; os valores restantes tentam os demais
+        detectado = detectar_formato_data(textos)
+        formatos = [detectado] + [formato for formato in FORMATOS_DATA if formato != detectado] if detectado else []
+        for formato in formatos:
+            faltando = datas.isna()
+            if not faltando.any():
+                break
+            datas[faltando] = pd.to_datetime(textos[faltando], format=formato, errors='coerce')
+    
+    # Devolve cada data distinta às linhas de origem (código -1 = ausente)
+    convertidas = np.append(np.asarray(datas, dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))[codigos]
+    return pd.Series(convertidas, index=serie.index, name=serie.name)
+
+def formatar_data_serie(datas, formato_saida='%d/%m/%Y'):
+    """
+    Formata uma coluna de datas, convertendo e formatando só os valores distintos.
+    
+    Como em formatar_data, textos que não são datas reconhecidas são mantidos
+    e valores ausentes viram "".
+    
+    Args:
+        datas: Series, array ou lista de datas (texto ou datetime)
+        formato_saida: Formato de saída desejado
+    
+    Returns:
+        Series: Datas formatadas (mesmo índice, se a entrada for Series)
+    """
+    serie = datas if isinstance(datas, pd.Series) else pd.Series(datas)
+    codigos, unicos = pd.factorize(serie)
+    
+    convertidas = interpretar_datas(pd.Series(unicos))
+    textos = convertidas.dt.strftime(formato_saida)
+    textos = textos.where(convertidas.notna(), pd.Series(unicos).astype(str))
+    
+    formatadas = np.append(textos.to_numpy(dtype=object), "")[codigos]
+    return pd.Series(formatadas, index=serie.index, name=serie.name, dtype=object)
@@ -1,4 +1,29 @@
 from datetime import datetime
+import numpy as np
+import pandas as pd
+
+from utils.formatters import interpretar_datas
+
+# Tipos de lançamento aceitos
+TIPOS_VALIDOS = ["Receita", "Custo", "Despesa"]
+
+# Códigos de erro da validação em lote (bits; uma linha pode ter vários)
+ERRO_EMPRESA_VAZIA = 1
+ERRO_DESCRICAO_VAZIA = 2
+ERRO_TIPO_INVALIDO = 4
+ERRO_VALOR_NAO_NUMERICO = 8
+ERRO_VALOR_NAO_POSITIVO = 16
+ERRO_DATA_INVALIDA = 32
+
+# Descrição de cada código de erro
+MENSAGENS_ERRO = {
+    ERRO_EMPRESA_VAZIA: "empresa vazia",
+    ERRO_DESCRICAO_VAZIA: "descrição vazia",
+    ERRO_TIPO_INVALIDO: "tipo inválido",
+    ERRO_VALOR_NAO_NUMERICO: "valor não numérico",
+    ERRO_VALOR_NAO_POSITIVO: "valor não positivo",
+    ERRO_DATA_INVALIDA: "data inválida"
+}
 
 def validar_formulario(empresa, data, tipo, descricao, valor):
     """
@@ -23,7 +48,7 @@ def validar_formulario(empresa, data, tipo, descricao, valor):
         return False
     
     # Valida tipo
-    if not tipo or tipo not in ["Receita", "Custo", "Despesa"]:
+    if not tipo or tipo not in TIPOS_VALIDOS:
         return False
     
     # Valida descrição
@@ -35,3 +60,71 @@ def validar_formulario(empresa, data, tipo, descricao, valor):
         return False
     
     return True
+
+def _textos_vazios(serie):
+    """Indica os valores ausentes ou em branco, verificando só os valores distintos."""
+    codigos, unicos = pd.factorize(serie)
+    vazios = pd.Series(unicos, dtype=object).astype(str).str.strip().eq('').to_numpy()
+    
+    # Código -1 (última posição) = valor ausente
+    return np.append(vazios, True)[codigos]
+
+def _numeros(serie):
+    """Converte para float (NaN se não numérico); textos são convertidos pelos valores distintos."""
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        return serie.to_numpy(dtype='float64', na_value=np.nan)
+    
+    codigos, unicos = pd.factorize(serie)
+    numeros = pd.to_numeric(pd.Series(unicos, dtype=object), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    
+    return np.append(numeros, np.nan)[codigos]
+
+def validar_lancamentos(df):
+    """
+    Valida um DataFrame de lançamentos inteiro com operações por coluna.
+    
+    Cada linha recebe um código com um bit por problema encontrado (veja
+    MENSAGENS_ERRO); colunas de texto são verificadas pelos valores distintos.
+    
+    Args:
+        df: DataFrame com as colunas empresa, data, tipo, descricao e valor
+    
+    Returns:
+        tuple: (validos, erros). validos é uma Series booleana (True para as
+        linhas sem erro) e erros uma Series de inteiros com os códigos, ambas
+        com o índice de df
+    """
+    erros = np.zeros(len(df), dtype='int64')
+    
+    erros |= np.where(_textos_vazios(df['empresa']), ERRO_EMPRESA_VAZIA, 0)
+    erros |= np.where(_textos_vazios(df['descricao']), ERRO_DESCRICAO_VAZIA, 0)
+    erros |= np.where(df['tipo'].isin(TIPOS_VALIDOS).to_numpy(), 0, ERRO_TIPO_INVALIDO)
+    
+    # Valor: numérico e maior que zero
+    valores = _numeros(df['valor'])
+    erros |= np.where(np.isnan(valores), ERRO_VALOR_NAO_NUMERICO, 0)
+    erros |= np.where(valores <= 0, ERRO_VALOR_NAO_POSITIVO, 0)
+    
+    # Data: em um dos formatos reconhecidos
+    erros |= np.where(interpretar_datas(df['data']).isna().to_numpy(), ERRO_DATA_INVALIDA, 0)
+    
+    erros = pd.Series(erros, index=df.index, name='erros')
+    return erros == 0, erros
+
+def descrever_erros(erros):
+    """
+    Converte códigos de erro de validar_lancamentos em texto.
+    
+    Args:
+        erros: Series de códigos
+    
+    Returns:
+        Series: Descrições separadas por "; " ("" para linhas válidas)
+    """
+    codigos, unicos = pd.factorize(erros)
+    textos = np.array([
+        "; ".join(mensagem for bit, mensagem in MENSAGENS_ERRO.items() if int(codigo) & bit)
+        for codigo in unicos
+    ] + [""], dtype=object)
+    
+    return pd.Series(textos[codigos], index=erros.index, name=erros.name)